@@ -0,0 +1,191 @@
+import os
+import random
+import numpy as np
+from dijkstra import shortest_path_tree
+from graph import EDGE_FILE, file_stamp, load_graph, read_arrays, stamps_fresh, write_arrays
+
+NUM_LANDMARKS = 8
+
+
+class Landmarks:
+    """
+    ALT (A*, landmarks, triangle inequality) lower bounds.
+
+    frm[k][i] is the distance from landmark k to index i and to[k][i] the
+    distance from i to landmark k (inf when unreachable), kept as float32.
+    By the triangle inequality both frm[k][t] - frm[k][i] and
+    to[k][i] - to[k][t] are lower bounds of the distance from i to t.
+
+    version is the graph.version the distances were measured on.  Bounds
+    stay admissible while edges only get longer, so bound() measures them
+    again (refresh) only once an edge got shorter after that.
+    """
+
+    def __init__(self, graph, nodes, frm, to, version=0):
+        self.graph = graph
+        self.nodes = nodes  # landmark indices
+        self._reversed = None
+        self._forward = None    # the landmarks these are the reversed() of
+        self._set(frm, to, version)
+
+    def _set(self, frm, to, version):
+        self.frm = frm
+        self.to = to
+        self.version = version
+        # float32 rounding may make a bound a little too large, take off
+        # a few ulps of the longest distance so they stay admissible
+        finite = np.concatenate((frm[np.isfinite(frm)], to[np.isfinite(to)], [1.0]))
+        self.slack = 4 * float(np.spacing(np.float32(finite.max())))
+        self._table = None
+
+    def reversed(self):
+        """
+        The same landmarks seen on graph.reverse(), where from and to swap.
+        """
+        if self._reversed is None:
+            self._reversed = Landmarks(self.graph.reverse(), self.nodes, self.to, self.frm,
+                                       self.version)
+            self._reversed._reversed = self
+            self._reversed._forward = self
+        return self._reversed
+
+    def refresh(self):
+        """
+        Measures the distances of the same landmark nodes again on the
+        current weights of the graph, for these and the reversed() ones.
+        """
+        if self._forward is not None:
+            return self._forward.refresh()
+        graph, reverse = self.graph, self.graph.reverse()
+        nodes = self.nodes.tolist()
+        frm = np.array([_distances(graph, v) for v in nodes], dtype=np.float32)
+        to = np.array([_distances(reverse, v) for v in nodes], dtype=np.float32)
+        self._set(frm, to, graph.version)
+        if self._reversed is not None:
+            self._reversed._set(to, frm, graph.version)
+
+    def table(self):
+        """
+        frm and to side by side per node, row i is frm[:, i] then to[:, i],
+        so bound() reads the numbers of a node from one place in memory.
+        Built on first use.
+        """
+        if self._table is None:
+            k, n = self.frm.shape
+            table = np.empty((n, 2 * k), dtype=np.float32)
+            table[:, :k] = self.frm.T
+            table[:, k:] = self.to.T
+            self._table = memoryview(table.ravel())
+        return self._table
+
+    def bound(self, end, extra=None):
+        """
+        Returns h with h(i) the lower bound of the distance from the index
+        i to the index end, max'ed with extra[i] when extra (another
+        admissible bound, like a heuristic.csv column) is given.  Nothing
+        is computed until a node is asked, wrap it in SearchArena.cached
+        to compute every node once per query.
+        """
+        if self.graph.shortened > self.version:
+            self.refresh()
+        table = self.table()
+        k = len(self.nodes)
+        w = 2 * k
+        row = table[end * w:end * w + w].tolist()
+        fe, te = row[:k], row[k:]
+        slack = self.slack
+        extra = None if extra is None else memoryview(extra)
+
+        def h(i):
+            row = table[i * w:i * w + w].tolist()
+            best = 0.0
+            for j in range(k):
+                # nan from inf - inf fails the test, nothing is known there
+                a = fe[j] - row[j]
+                if a > best:
+                    best = a
+                b = row[k + j] - te[j]
+                if b > best:
+                    best = b
+            best = max(best - slack, 0.0)
+            if extra is not None and extra[i] > best:
+                best = extra[i]
+            return best
+
+        return h
+
+
+def _distances(graph, source):
+    # one-to-all distances from source as a float32 array
+    arena, _ = shortest_path_tree(graph, source)
+    return arena.distances().astype(np.float32)
+
+
+def build_landmarks(graph, k=NUM_LANDMARKS, seed=0):
+    """
+    Picks k landmarks far apart from each other: the first is the node
+    farthest from a random one, every next one the node whose round trip
+    to the closest landmark chosen so far is the longest.
+    """
+    reverse = graph.reverse()
+    rnd = random.Random(seed)
+    d = _distances(graph, rnd.randrange(graph.num_nodes()))
+    d[~np.isfinite(d)] = -1.0
+    nodes, frm, to = [], [], []
+    closest = np.full(graph.num_nodes(), np.inf)
+    nxt = int(np.argmax(d))
+    for _ in range(k):
+        nodes.append(nxt)
+        frm.append(_distances(graph, nxt))
+        to.append(_distances(reverse, nxt))
+        trip = frm[-1].astype(np.float64) + to[-1]
+        np.minimum(closest, trip, out=closest)
+        # only nodes that go both ways with every landmark can be next
+        score = np.where(np.isfinite(closest), closest, -1.0)
+        score[nodes] = -1.0
+        nxt = int(np.argmax(score))
+    return Landmarks(graph, np.array(nodes, dtype=np.int32),
+                     np.array(frm, dtype=np.float32), np.array(to, dtype=np.float32),
+                     graph.version)
+
+
+def alt_path_of(path, timed=False):
+    # edges.csv -> edges.alt (or edges.time.alt) next to it
+    return os.path.splitext(path)[0] + ('.time.alt' if timed else '.alt')
+
+
+# landmarks already loaded in this process, key is (path of edge file, k, timed)
+_landmarks = dict()
+
+
+def load_landmarks(path=EDGE_FILE, k=NUM_LANDMARKS, timed=False):
+    """
+    Returns the k landmarks of the edge file, read from edges.alt next to
+    it, which is built and written first when missing or stale.
+    With timed=True the landmarks bound travel time on graph.timed()
+    instead, and are kept in edges.time.alt.
+    """
+    path = os.path.realpath(path)
+    if (path, k, timed) in _landmarks:
+        return _landmarks[(path, k, timed)]
+
+    graph = load_graph(path)
+    if timed:
+        graph = graph.timed()
+    alt_path = alt_path_of(path, timed)
+    opened = read_arrays(alt_path)
+    if (opened is not None and len(opened[0]['nodes']) == k
+            and stamps_fresh(opened[1], [('edges', path)], alt_path)):
+        a = opened[0]
+        lm = Landmarks(graph, a['nodes'], a['frm'], a['to'])
+    else:
+        opened = None # unmap the stale file before it is replaced
+        meta = {'edges': file_stamp(path)}
+        lm = build_landmarks(graph, k)
+        try:
+            if graph.version == 0: # else they are not the landmarks of the csv
+                write_arrays(alt_path, {'nodes': lm.nodes, 'frm': lm.frm, 'to': lm.to}, meta)
+        except OSError:
+            pass # can not write next to the csv, keep it in memory
+    _landmarks[(path, k, timed)] = lm
+    return lm
@@ -0,0 +1,101 @@
+import weakref
+import numpy as np
+
+
+class SearchArena:
+    """
+    Per-node search state of one graph, reused by every query on it.
+
+    dist/prev hold the distance and previous node of each index, seen and
+    closed the epoch in which the index was reached and settled.  An entry
+    is only valid when its epoch is the current one, so reset() just moves
+    to the next epoch instead of clearing n entries.  A search takes
+    ep = reset() and dis, prev, seen, closed = view, and only trusts
+    dis[i]/prev[i] once seen[i] == ep.
+
+    An arena is not re-entrant: one search at a time per arena and process.
+    """
+
+    def __init__(self, n):
+        self.dist = np.zeros(n, dtype=np.float64)
+        self.prev = np.full(n, -1, dtype=np.int32)
+        self.seen = np.zeros(n, dtype=np.int64)
+        self.closed = np.zeros(n, dtype=np.int64)
+        self.epoch = 0
+        # memoryviews read and write plain python numbers in the search loops
+        self.view = (memoryview(self.dist), memoryview(self.prev),
+                     memoryview(self.seen), memoryview(self.closed))
+        self.memo = None    # values and epochs for cached(), made on first use
+
+    def reset(self):
+        """
+        Starts a new query, forgetting every node of the last one in O(1).
+        Returns the new epoch.
+        """
+        self.epoch += 1
+        return self.epoch
+
+    def cached(self, func):
+        """
+        Returns h with h(i) == func(i), where func(i) is only computed the
+        first time i is asked in the current query and then kept in the
+        arena, so a heuristic costs nothing for nodes a search never
+        reaches.  Call it after reset(); one per query.
+        """
+        if self.memo is None:
+            n = len(self.dist)
+            self.memo = (memoryview(np.zeros(n, dtype=np.float64)),
+                         memoryview(np.zeros(n, dtype=np.int64)))
+        val, stamp = self.memo
+        ep = self.epoch
+
+        def h(i):
+            if stamp[i] == ep:
+                return val[i]
+            v = val[i] = func(i)
+            stamp[i] = ep
+            return v
+
+        return h
+
+    def distances(self):
+        """
+        Distance of every index in the current query, inf if not reached.
+        """
+        return np.where(self.seen == self.epoch, self.dist, np.inf)
+
+    def settled(self):
+        """
+        Indices settled in the current query.
+        """
+        return np.flatnonzero(self.closed == self.epoch)
+
+    def path(self, start, end):
+        """
+        Indices from end back to start by the prev links, like the searchers
+        return their paths.
+        """
+        prev = self.view[1]
+        path = [end]
+        while path[-1] != start:
+            path.append(prev[path[-1]])
+        return path
+
+
+# the arenas of every graph in this process
+_arenas = weakref.WeakKeyDictionary()
+
+
+def get_arena(graph, side=0):
+    """
+    Returns the arena of graph, made on first use.  Searches that need two
+    at once, like the forward and backward halves of a bidirectional
+    search, take side 0 and side 1.
+    """
+    arenas = _arenas.get(graph)
+    if arenas is None:
+        arenas = _arenas[graph] = dict()
+    arena = arenas.get(side)
+    if arena is None:
+        arena = arenas[side] = SearchArena(graph.num_nodes())
+    return arena
@@ -1,77 +1,98 @@
-import csv
-import os
-import heapq
-
-py_dir = os.path.dirname(os.path.realpath(__file__))
-edgeFile = open(py_dir+'\\edges.csv', newline='')
-heuristicFile = open(py_dir+'\\heuristic.csv', newline='')
-rws = csv.DictReader(edgeFile)
-
-# use dict to store edges 
-# key is start. And value is a 2d-list
-# [[end, dis, spd_lim], ...]
-edges = dict()
-lis = list()
-prev = -1
-for rw in rws:
-    # because edges.csv is sorted by start node, this way is okay
-    if int(rw['start']) != prev:
-        edges[prev] = lis
-        prev = int(rw['start'])
-        lis = list() # initialize
-
-    lis.append([int(rw['end']), float(rw['distance']), float(rw['speed limit'])])
-edgeFile.close() # data are stored in edges, thus close the file
-
-# use dict to store heuristic
-# key is the node, value is tuple (dis to id1,2,3)
-heu = dict()
-rws_heu = csv.DictReader(heuristicFile)
-for rwh in rws_heu:
-    heu[int(rwh['node'])] = (float(rwh['1079387396']), float(rwh['1737223506']), float(rwh['8513026827']))
-
-# use heapq (priority_queue) storing 
-# tuple containing (dis, next_node)
-# to get mini distance choice
-def astar_time(start, end):
+from alt import load_landmarks
+from arena import get_arena
+from graph import load_graph
+from heap import IndexedHeap
+
+graph = load_graph()
+
+# the same edges weighted by seconds, sec[e] = distance / speed limit
+timed = graph.timed()
+
+# heu[sel][i] is the straight-line distance from index i to the sel-th
+# destination column of heuristic.csv (kept in the graph cache)
+heu = graph.heu
+
+# landmark lower bounds of the distance (see alt.py)
+landmarks = load_landmarks()
+
+# also use landmarks picked on travel time, they bound the seconds
+# directly and are much tighter than distance / max speed
+TIME_LANDMARKS = True
+time_landmarks = None
+
+
+def time_heuristic(end):
+    """
+    Returns h with h(i) a lower bound of the seconds from the index i to
+    the index end.
+
+    Nothing drives faster than the highest speed limit, so any lower bound
+    of the distance (the heuristic.csv column of end, or the landmark
+    bound) divided by that speed bounds the time.
+    """
+    global time_landmarks
+    end_id = int(graph.ids[end])
+    sel = graph.dests.index(end_id) if end_id in graph.dests else None
+    by_distance = landmarks.bound(end, None if sel is None else heu[sel])
+    fastest = graph.max_speed()
+    if not TIME_LANDMARKS:
+        return lambda i: by_distance(i) / fastest
+    if time_landmarks is None:
+        time_landmarks = load_landmarks(timed=True)
+    by_time = time_landmarks.bound(end)
+    return lambda i: max(by_distance(i) / fastest, by_time(i))
+
+
+# use an indexed heap (priority_queue) of next_node keyed by
+# sec + heuristic to get the most promising choice, a shorter
+# time found later decreases the key instead of pushing again
+def astar_time(start, end, trace=None):
     # Begin your code (Part 6)
-    # to select the testcase
-    if end==1079387396: sel=0
-    elif end==1737223506: sel=1
-    else: sel=2
 
     # initialize
-    ans = dict()
-    ans[start] = [0.0, -1]# the distance from start to start is 0
-    nw = (0, start) # changed to tuple
-    pq = []
+    off, tgt, sec = timed.view()
+    start, end = graph.index(start), graph.index(end)
+    arena = get_arena(timed)
+    ep = arena.reset()
+    dis, prev, seen, closed = arena.view
+    h = arena.cached(time_heuristic(end))
+    dis[start], prev[start], seen[start] = 0.0, -1, ep# the time from start to start is 0
+    pq = IndexedHeap() if trace is None else trace.heap()
+    pq.push(start, h(start))
     num_vised = 0
-    done = False
     path = list()
+    if trace is not None:
+        trace.phase('search')
+
+    while pq:
+        _, nw = pq.pop()
+        t = dis[nw]
+        closed[nw] = ep # its shortest time is known
+        if nw == end: # reach the end, its time can not get shorter
+            break
+        for e in range(off[nw], off[nw+1]): # e is the index of edge (nw, tgt[e])
+            nxt = tgt[e]
+            if closed[nxt] == ep:
+                continue
+            if seen[nxt] != ep:
+                # this node has not been visited yet
+                seen[nxt], dis[nxt], prev[nxt] = ep, t + sec[e], nw# update the time and num_node
+                pq.push(nxt, t + sec[e] + h(nxt))
+                num_vised+=1
+            elif t + sec[e] < dis[nxt]:
+                # renew to shortest time
+                dis[nxt], prev[nxt] = t + sec[e], nw
+                pq.decrease(nxt, t + sec[e] + h(nxt))
+
+    if closed[end] != ep: # end can not be reached from start
+        return path, float('inf'), num_vised
+
+    if trace is not None:
+        trace.phase('path')
+    # to get the path by reversing back
+    path = arena.path(start, end)
 
-    while not done:
-        for next in edges[nw[1]]: # next is a list [end, dis, spd_lim]
-            if next[0] in edges: # if there is edge started from this node
-                if next[0] != end and next[0] not in ans:
-                    # works when not achieve to final node 
-                    # and this node has not been visited yet
-                    heapq.heappush(pq, (ans[nw[1]][0]+heu[next[0]][sel], next[0]) )
-                    ans[next[0]] = [ans[nw[1]][0] + next[1], nw[1]]# update the distance and num_node
-                    num_vised+=1
-                elif next[0]==end: # reach the end
-                    ans[next[0]] = [ans[nw[1]][0] + next[1], nw[1]]
-                    # to get the path by reversing back
-                    back = end
-                    path.append(back)
-                    while ans[back][1] != start:
-                        path.append(ans[back][1])
-                        back = ans[back][1]
-                    path.append(start)
-                    done = True
-                    num_vised+=1
-        nw = heapq.heappop(pq)
-
-    return path, ans[end][0], num_vised
+    return graph.node_ids(path), dis[end], num_vised
     # End your code (Part 6)
 
 
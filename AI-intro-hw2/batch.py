@@ -0,0 +1,107 @@
+import os
+from multiprocessing import Pool
+from dijkstra import shortest_path_tree
+from graph import EDGE_FILE, load_graph
+
+# graph of the worker process, set by _attach
+_graph = None
+
+
+def _route_group(graph, source, targets):
+    # answer every (source, target) pair from one tree
+    arena, num_vised = shortest_path_tree(graph, source, targets)
+    dis, _, _, closed = arena.view
+    out = []
+    for end in targets:
+        if closed[end] != arena.epoch:
+            out.append(([], float('inf'), num_vised))
+        else:
+            out.append((graph.node_ids(arena.path(source, end)), dis[end], num_vised))
+    return out
+
+
+def _attach(path):
+    # pool initializer, the memory-mapped cache is shared by all workers
+    global _graph
+    _graph = load_graph(path)
+
+
+def pool_imap(func, args, workers=None, path=EDGE_FILE, timed=False):
+    """
+    Yields func(graph, arg) for every arg, in order, as they are done.
+
+    The calls are spread over a pool of worker processes that attach to the
+    graph of the edge file (workers=1 runs them in this process).  func has
+    to be a module level function so it can be sent to the workers.
+    With timed=True func gets graph.timed() instead.
+    """
+    args = list(args)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(args))
+    if workers <= 1:
+        graph = load_graph(path)
+        graph = graph.timed() if timed else graph
+        for arg in args:
+            yield func(graph, arg)
+        return
+    with Pool(workers, initializer=_attach, initargs=(path,)) as pool:
+        chunk = max(1, len(args) // (workers * 4))
+        work = _call_timed if timed else _call_plain
+        yield from pool.imap(work, [(func, arg) for arg in args], chunksize=chunk)
+
+
+def _call_plain(task):
+    func, arg = task
+    return func(_graph, arg)
+
+
+def _call_timed(task):
+    func, arg = task
+    return func(_graph.timed(), arg)
+
+
+def _route_task(graph, task):
+    source, targets = task
+    return _route_group(graph, source, targets)
+
+
+def route_many(pairs, workers=None, path=EDGE_FILE):
+    """
+    Routes many (start, end) node id pairs by shortest distance.
+
+    Pairs with the same start share one Dijkstra tree, and the trees are
+    spread over a pool of worker processes (workers=1 runs in this process).
+    Returns one (path, dist, num_visited) per pair, in the order of pairs,
+    like ucs(); an unreachable end gives ([], inf, num_visited).
+    """
+    graph = load_graph(path)
+    pairs = [(graph.index(s), graph.index(t)) for s, t in pairs]
+
+    # group the pairs by start, remembering where each answer goes
+    groups = dict()
+    for i, (s, t) in enumerate(pairs):
+        groups.setdefault(s, ([], []))
+        groups[s][0].append(t)
+        groups[s][1].append(i)
+    tasks = [(s, targets) for s, (targets, _) in groups.items()]
+    results = pool_imap(_route_task, tasks, workers, path)
+
+    ans = [None] * len(pairs)
+    for (_, (_, where)), res in zip(groups.items(), results):
+        for i, r in zip(where, res):
+            ans[i] = r
+    return ans
+
+
+if __name__ == '__main__':
+    import random
+    import time
+    graph = load_graph()
+    rnd = random.Random(0)
+    ids = graph.ids.tolist()
+    sources = rnd.sample(ids, 100)
+    pairs = [(s, rnd.choice(ids)) for s in sources for _ in range(20)]
+    t = time.time()
+    routes = route_many(pairs)
+    print(f'Routed {len(pairs)} pairs in {time.time() - t:.2f} s')
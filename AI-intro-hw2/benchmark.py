@@ -0,0 +1,315 @@
+"""
+Benchmarks the hw2 searchers on synthetic road networks.
+
+    python benchmark.py --grid 300x300 --geometric 100000 --queries 20
+
+Every network is written in the edges.csv/heuristic.csv schema into its
+own directory.  Each searcher then runs the same query set in a fresh
+process (HW2_EDGE_FILE points it at the network), so peak RSS is measured
+per algorithm.  Wall time, num_visited, the queue operations (pushes,
+pops and decrease-keys, counted in a second, traced run of each query so
+the timing is not affected, see instrument.py), path cost and its ratio
+to the optimal cost go into a json file (benchmark.json by default).
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+import numpy as np
+
+py_dir = os.path.dirname(os.path.realpath(__file__))
+
+# name -> (module, function); astar_time is measured in seconds, the rest in meters
+ALGORITHMS = {
+    'bfs': ('bfs', 'bfs'),
+    'dfs': ('dfs_stack', 'dfs'),
+    'ucs': ('ucs', 'ucs'),
+    'astar': ('astar', 'astar'),
+    'astar_time': ('astar_time', 'astar_time'),
+}
+SPEED_LIMITS = np.array([30.0, 40.0, 50.0, 60.0, 80.0])
+NUM_DESTS = 3  # heuristic.csv columns, like the bundled one
+FIRST_ID = 1000000
+
+
+#############################
+# Synthetic road networks   #
+#############################
+
+def grid_network(rows, cols, seed=0):
+    """
+    A rows x cols street grid about 100 m apart with jittered crossings.
+    Every street goes both ways.  Returns (xy, start, end) with node
+    indices.
+    """
+    rnd = np.random.default_rng(seed)
+    r, c = np.divmod(np.arange(rows * cols), cols)
+    xy = np.column_stack((c, r)) * 100.0 + rnd.uniform(-20, 20, (rows * cols, 2))
+    idx = np.arange(rows * cols).reshape(rows, cols)
+    a = np.concatenate((idx[:, :-1].ravel(), idx[:-1, :].ravel()))
+    b = np.concatenate((idx[:, 1:].ravel(), idx[1:, :].ravel()))
+    return xy, np.concatenate((a, b)), np.concatenate((b, a))
+
+
+def geometric_network(n, degree=5.0, seed=0):
+    """
+    n crossings placed uniformly at random (one per 100 m x 100 m on
+    average), with a two-way road between any two closer than the radius
+    that gives the expected degree.  Returns (xy, start, end).
+    """
+    rnd = np.random.default_rng(seed)
+    side = np.sqrt(n) * 100.0
+    radius = 100.0 * np.sqrt(degree / np.pi)
+    xy = rnd.uniform(0, side, (n, 2))
+
+    # bucket the points into radius sized cells, only the 3x3 cells
+    # around a point can hold its neighbours
+    cells = int(np.ceil(side / radius))
+    cx, cy = np.minimum((xy / radius).astype(np.int64), cells - 1).T
+    cell = cx * cells + cy
+    order = np.argsort(cell, kind='stable')
+    counts = np.bincount(cell, minlength=cells * cells)
+    first = np.concatenate(([0], np.cumsum(counts)))
+    starts, ends = [], []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            nx, ny = cx + dx, cy + dy
+            ok = (nx >= 0) & (nx < cells) & (ny >= 0) & (ny < cells)
+            other = np.where(ok, nx * cells + ny, 0)
+            for j in range(int(counts.max())):
+                has = ok & (counts[other] > j)
+                p = np.flatnonzero(has)
+                q = order[first[other[p]] + j]
+                near = (q != p) & (np.hypot(*(xy[p] - xy[q]).T) < radius)
+                starts.append(p[near])
+                ends.append(q[near])
+    return xy, np.concatenate(starts), np.concatenate(ends)
+
+
+def write_network(dirname, xy, start, end, seed=0):
+    """
+    Writes a network as edges.csv and heuristic.csv into dirname.
+    A road is 0-20% longer than the straight line between its ends, so
+    the straight-line heuristic stays admissible.  Returns the node ids of
+    the heuristic.csv columns, all in the largest connected part.
+    """
+    from dijkstra import shortest_path_tree
+    from graph import build_graph
+    rnd = np.random.default_rng(seed)
+    os.makedirs(dirname, exist_ok=True)
+    n = len(xy)
+    ids = FIRST_ID + np.arange(n)
+    dis = np.hypot(*(xy[start] - xy[end]).T) * rnd.uniform(1.0, 1.2, len(start))
+    dis = np.maximum(dis, 0.001)
+    spd = rnd.choice(SPEED_LIMITS, len(start))
+
+    # every road is two-way, so what a node reaches is its whole part;
+    # sample nodes until one lies in a part holding most of the network
+    graph = build_graph(ids[start], ids[end], dis, spd)
+    pick = random.Random(seed)
+    while True:
+        first = pick.randrange(n)
+        arena, reached = shortest_path_tree(graph, first)
+        if reached * 2 > n or reached == n:
+            break
+    part = arena.settled()
+    dests = [int(ids[i]) for i in pick.sample(part.tolist(), min(NUM_DESTS, len(part)))]
+
+    order = np.argsort(ids[start], kind='stable')
+    with open(os.path.join(dirname, 'edges.csv'), 'w') as f:
+        f.write('start,end,distance,speed limit\n')
+        np.savetxt(f, np.column_stack((ids[start][order], ids[end][order], dis[order], spd[order])),
+                   fmt=['%d', '%d', '%.3f', '%.1f'], delimiter=',')
+    with open(os.path.join(dirname, 'heuristic.csv'), 'w') as f:
+        f.write(','.join(['node'] + [str(d) for d in dests]) + '\n')
+        # only nodes with a road, like edges.csv
+        used = np.unique(np.concatenate((start, end)))
+        line = np.hypot(*(xy[used, None, :] - xy[np.array(dests) - FIRST_ID][None, :, :]).transpose(2, 0, 1))
+        np.savetxt(f, np.column_stack((ids[used], line)), fmt=['%d'] + ['%.6f'] * len(dests), delimiter=',')
+    return dests, part
+
+
+def make_queries(ids, part, dests, count, seed=0):
+    # fixed query set: random starts in the connected part, ends cycling over dests
+    rnd = random.Random(seed)
+    return [(int(ids[rnd.choice(part)]), dests[i % len(dests)]) for i in range(count)]
+
+
+def optimal_costs(edge_file, queries):
+    """
+    Reference shortest distances and times of the queries by plain Dijkstra
+    from each end on the reversed graph.
+    """
+    from dijkstra import shortest_path_tree
+    from graph import load_graph
+    graph = load_graph(edge_file)
+    best = {'distance': dict(), 'time': dict()}
+    for end in sorted(set(t for _, t in queries)):
+        for kind, g in (('distance', graph), ('time', graph.timed())):
+            arena, _ = shortest_path_tree(g.reverse(), graph.index(end))
+            dist = arena.distances()
+            for s, t in queries:
+                if t == end:
+                    best[kind][(s, t)] = float(dist[graph.index(s)])
+    return best
+
+
+#############################
+# Running the searchers     #
+#############################
+
+def run_child(name, edge_file, queries):
+    """
+    Runs one searcher over the queries in this (fresh) process and returns
+    its measurements.  HW2_EDGE_FILE must be set before the import.
+    """
+    os.environ['HW2_EDGE_FILE'] = edge_file
+    from instrument import record
+    module, func = ALGORITHMS[name]
+    t = time.perf_counter()
+    search = getattr(__import__(module), func)
+    setup = time.perf_counter() - t
+
+    records = []
+    for s, e in queries:
+        t = time.perf_counter()
+        path, cost, num_visited = search(s, e)
+        seconds = time.perf_counter() - t
+        _, trace = record(search, s, e)
+        records.append({'start': s, 'end': e, 'seconds': seconds,
+                        'num_visited': num_visited, 'cost': cost, 'path_nodes': len(path),
+                        'pushes': trace.pushes, 'pops': trace.pops,
+                        'decreases': trace.relaxations - trace.pushes})
+    return {'setup_seconds': setup, 'peak_rss_kb': peak_rss_kb(), 'queries': records}
+
+
+def peak_rss_kb():
+    # ru_maxrss survives exec on Linux, so it would report the parent's
+    # peak; VmHWM belongs to this process image only
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_algorithm(name, edge_file, queries):
+    proc = subprocess.run([sys.executable, os.path.realpath(__file__), '--child', name, edge_file],
+                          input=json.dumps(queries), capture_output=True, text=True)
+    if proc.returncode != 0:
+        return {'error': proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'failed'}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def summarize(result, best):
+    records = result['queries']
+    ratios = []
+    for r in records:
+        opt = best[(r['start'], r['end'])]
+        r['optimal_cost'] = opt
+        r['ratio'] = r['cost'] / opt if opt > 0 else 1.0
+        ratios.append(r['ratio'])
+    result['summary'] = {
+        'total_seconds': sum(r['seconds'] for r in records),
+        'mean_visited': sum(r['num_visited'] for r in records) / len(records),
+        'mean_pushes': sum(r['pushes'] for r in records) / len(records),
+        'mean_pops': sum(r['pops'] for r in records) / len(records),
+        'mean_decreases': sum(r['decreases'] for r in records) / len(records),
+        'max_ratio': max(ratios),
+        'all_optimal': all(r <= 1.0 + 1e-9 for r in ratios),
+    }
+
+
+def benchmark_network(label, dirname, network, num_queries, algorithms, seed=0):
+    t = time.perf_counter()
+    xy, start, end = network
+    dests, part = write_network(dirname, xy, start, end, seed)
+    generate = time.perf_counter() - t
+    edge_file = os.path.join(dirname, 'edges.csv')
+    queries = make_queries(FIRST_ID + np.arange(len(xy)), part.tolist(), dests, num_queries, seed)
+
+    # build the caches once here so the searchers only measure loading them
+    from alt import load_landmarks
+    from graph import compile_graph
+    prepare = dict()
+    t = time.perf_counter()
+    compile_graph(edge_file)
+    prepare['graph_cache'] = time.perf_counter() - t
+    for timed in (False, True):
+        t = time.perf_counter()
+        load_landmarks(edge_file, timed=timed)
+        prepare['time_landmarks' if timed else 'landmarks'] = time.perf_counter() - t
+    best = optimal_costs(edge_file, queries)
+
+    out = {'name': label, 'nodes': len(xy), 'edges': len(start), 'generate_seconds': generate,
+           'prepare_seconds': prepare, 'results': dict()}
+    for name in algorithms:
+        result = run_algorithm(name, edge_file, queries)
+        if 'error' not in result:
+            summarize(result, best['time' if name == 'astar_time' else 'distance'])
+        out['results'][name] = result
+    return out
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Benchmark the hw2 searchers on synthetic road networks.')
+    parser.add_argument('--grid', action='append', default=[], metavar='ROWSxCOLS',
+                        help='a grid network, may be repeated (e.g. 1000x1000 has 4M edges)')
+    parser.add_argument('--geometric', action='append', default=[], type=int, metavar='NODES',
+                        help='a random geometric network, may be repeated')
+    parser.add_argument('--queries', type=int, default=20, help='queries per network')
+    parser.add_argument('--algorithms', default=','.join(ALGORITHMS), help='comma separated')
+    parser.add_argument('--workdir', default=os.path.join(py_dir, 'bench_networks'),
+                        help='where the generated networks are written')
+    parser.add_argument('--out', default='benchmark.json', help='json report')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--child', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        name, edge_file = args.child
+        queries = [tuple(q) for q in json.load(sys.stdin)]
+        print(json.dumps(run_child(name, edge_file, queries)))
+        return
+
+    if not args.grid and not args.geometric:
+        args.grid = ['100x100']
+        args.geometric = [10000]
+    algorithms = args.algorithms.split(',')
+    report = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': sys.version.split()[0],
+              'queries': args.queries, 'seed': args.seed, 'networks': []}
+    networks = []
+    for g in args.grid:
+        rows, cols = (int(x) for x in g.lower().split('x'))
+        networks.append(('grid-' + g, lambda rows=rows, cols=cols: grid_network(rows, cols, args.seed)))
+    for n in args.geometric:
+        networks.append(('geometric-%d' % n, lambda n=n: geometric_network(n, seed=args.seed)))
+
+    for label, make in networks:
+        res = benchmark_network(label, os.path.join(args.workdir, label), make(),
+                                args.queries, algorithms, args.seed)
+        report['networks'].append(res)
+        print(f"{label}: {res['nodes']} nodes, {res['edges']} edges")
+        for name, r in res['results'].items():
+            if 'error' in r:
+                print(f"  {name:<11} error: {r['error']}")
+                continue
+            s = r['summary']
+            print(f"  {name:<11} {s['total_seconds']:8.3f} s  visited {s['mean_visited']:10.1f}"
+                  f"  push/pop/decrease {s['mean_pushes']:9.1f} {s['mean_pops']:9.1f}"
+                  f" {s['mean_decreases']:8.1f}"
+                  f"  rss {r['peak_rss_kb'] / 1024:7.1f} MB  cost ratio <= {s['max_ratio']:.3f}")
+
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=1)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
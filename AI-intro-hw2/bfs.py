@@ -1,70 +1,134 @@
-import csv
-import os
 import queue
+import numpy as np
+from arena import get_arena
+from graph import load_graph
 
-# please put this python in the same folder as edges.csv
-py_dir = os.path.dirname(os.path.realpath(__file__))
-edgeFile = open(py_dir+'\\edges.csv', newline='')
-rws = csv.DictReader(edgeFile)
+graph = load_graph()
 
-# use dict to store edges 
-# key is start. And value is a 2d-list
-# [[end, dis, spd_lim], ...]
-edges = dict()
-lis = list()
-prev = -1
-for rw in rws:
-    # because edges.csv is sorted by start node, this way is okay
-    if int(rw['start']) != prev:
-        edges[prev] = lis
-        prev = int(rw['start'])
-        lis = list() # initialize
 
-    lis.append([int(rw['end']), float(rw['distance']), float(rw['speed limit'])])
-
-edgeFile.close() # data are stored in edges, thus close the file
-
-
-# use dict to store path (ans)
-# key is the end node, value is a list
-# distance from start to this node and the previous node in this path
-def bfs(start, end):
+# use the arena (see arena.py) to store path
+# dis[i] is the distance from start to index i and prev[i]
+# the previous node in this path, valid once seen[i] == ep
+def bfs(start, end, trace=None):
     # Begin your code (Part 1)
 
     # initialize
-    ans = dict()
-    ans[start] = [0.0, -1]# the distance from start to start is 0
+    off, tgt, wgt = graph.view()
+    start, end = graph.index(start), graph.index(end)
+    if start == end:
+        return graph.node_ids([start]), 0.0, 0
+    arena = get_arena(graph)
+    ep = arena.reset()
+    dis, prev, seen, _ = arena.view
+    dis[start], prev[start], seen[start] = 0.0, -1, ep# the distance from start to start is 0
     nw = start
     q = queue.SimpleQueue()
     num_vised = 0
     done = False
     path = list()
+    if trace is not None:
+        trace.phase('search')
 
     while not done:
-        for next in edges[nw]: # next is a list [end, dis, spd_lim]
-            if next[0] in edges: # if there is edge started from this node
-                if next[0] != end and next[0] not in ans:
-                    # works when not achieve to final node 
+        for e in range(off[nw], off[nw+1]): # e is the index of edge (nw, tgt[e])
+            nxt = tgt[e]
+            if off[nxt] != off[nxt+1]: # if there is edge started from this node
+                if nxt != end and seen[nxt] != ep:
+                    # works when not achieve to final node
                     # and this node has not been visited yet
-                    q.put(next[0])
-                    ans[next[0]] = [ans[nw][0] + next[1], nw]# update the distance and num_node
+                    q.put(nxt)
+                    if trace is not None:
+                        trace.push()
+                    seen[nxt], dis[nxt], prev[nxt] = ep, dis[nw] + wgt[e], nw# update the distance and num_node
                     num_vised+=1
-                elif next[0]==end: # reach the end
-                    ans[next[0]] = [ans[nw][0] + next[1], nw]
+                elif nxt==end: # reach the end
+                    seen[nxt], dis[nxt], prev[nxt] = ep, dis[nw] + wgt[e], nw
+                    if trace is not None:
+                        trace.phase('path')
                     # to get the path by reversing back
-                    back = end
-                    path.append(back)
-                    while ans[back][1] != start:
-                        path.append(ans[back][1])
-                        back = ans[back][1]
-                    path.append(start)
+                    path = arena.path(start, end)
                     done = True
                     num_vised+=1
-        nw = q.get()
+        if not done:
+            if q.empty(): # end can not be reached from start
+                return path, float('inf'), num_vised
+            nw = q.get()
+            if trace is not None:
+                trace.pop(nw, dis[nw])
 
-    return path, ans[end][0], num_vised
+    return graph.node_ids(path), dis[end], num_vised
     # End your code (Part 1)
 
+
+# level-synchronous BFS on the CSR arrays: every iteration expands the whole
+# frontier at once with NumPy gathers instead of one node per queue.get(),
+# for hop counts and unweighted routes on graphs too large for the loop above
+def bfs_levels(start, end=None, max_hops=None):
+    """
+    Hop count and BFS parent of every index from the index start, -1 where
+    it is not reached.  Stops after the level that reaches the index end,
+    or after max_hops levels.  Returns (hops, parent) int32 arrays.
+
+    The frontier is kept in the order its nodes were found and a node takes
+    the first frontier node that reaches it as parent, so the tree is the
+    one a queue based BFS builds.
+    """
+    n = graph.num_nodes()
+    offset, target = np.asarray(graph.offset), np.asarray(graph.target)
+    hops = np.full(n, -1, dtype=np.int32)
+    parent = np.full(n, -1, dtype=np.int32)
+    visited = np.zeros(n, dtype=bool)
+    visited[start], hops[start] = True, 0
+    frontier = np.array([start], dtype=np.int64)
+    level = 0
+
+    while len(frontier) and (end is None or not visited[end]):
+        if max_hops is not None and level >= max_hops:
+            break
+        level += 1
+        # gather the out edges of the whole frontier
+        first = offset[frontier]
+        count = offset[frontier + 1] - first
+        total = int(count.sum())
+        if total == 0:
+            break
+        run = np.repeat(np.cumsum(count) - count, count)
+        edges = np.arange(total) - run + np.repeat(first, count)
+        src = np.repeat(frontier, count)
+        nxt = target[edges]
+        new = ~visited[nxt]
+        nxt, src = nxt[new], src[new]
+        # first discovery of each node, in discovery order
+        _, where = np.unique(nxt, return_index=True)
+        where.sort()
+        frontier = nxt[where].astype(np.int64)
+        visited[frontier] = True
+        hops[frontier] = level
+        parent[frontier] = src[where]
+
+    return hops, parent
+
+
+def bfs_vec(start, end):
+    """
+    Fewest-hop route like bfs(), by bfs_levels.  Returns (path, dist,
+    num_visited) with the distance of the route in meters and the number
+    of nodes reached besides start.
+    """
+    start, end = graph.index(start), graph.index(end)
+    hops, parent = bfs_levels(start, end)
+    num_vised = int(np.count_nonzero(hops > 0))
+    if hops[end] < 0:
+        return [], float('inf'), num_vised
+    path = [end]
+    while path[-1] != start:
+        path.append(int(parent[path[-1]]))
+    # add the edges up in travel order, the lightest one between two nodes
+    dist = 0.0
+    for u, v in zip(path[:0:-1], path[-2::-1]):
+        dist += float(np.min(graph.weight[graph.edges_between(u, v)]))
+    return graph.node_ids(path), dist, num_vised
+
 if __name__ == '__main__':
     path, dist, num_visited = bfs(2270143902, 1079387396)
     print(f'The number of path nodes: {len(path)}')
@@ -0,0 +1,127 @@
+from alt import load_landmarks
+from arena import get_arena
+from graph import load_graph
+from heap import IndexedHeap
+
+graph = load_graph()
+
+# landmark lower bounds (see alt.py)
+landmarks = load_landmarks()
+
+
+# Both searches run at once, the forward one from start over the out edges
+# and the backward one from end over the in edges (graph.reverse()).
+# mu is the shortest start -> end distance seen where the two meet, and the
+# search stops once the two heap tops together can not beat it any more.
+#
+# With a potential p (zero for plain Dijkstra) the forward heap is keyed by
+# dis + p(node) and the backward heap by dis - p(node).  Both then see the
+# same non-negative reduced edge lengths, and the stopping rule stays
+# top_forward + top_backward >= mu.
+def _search(start, end, pot=None, trace=None):
+    start, end = graph.index(start), graph.index(end)
+    if start == end:
+        return graph.node_ids([start]), 0.0, 0
+
+    adj = (graph.view(), graph.reverse().view())
+    # the arena of each side holds dis/prev from start / to end, like
+    # ucs, an entry counts when its seen/closed is the side's epoch
+    arena = (get_arena(graph, 0), get_arena(graph, 1))
+    ep = (arena[0].reset(), arena[1].reset())
+    dis = (arena[0].view[0], arena[1].view[0])
+    prev = (arena[0].view[1], arena[1].view[1])
+    seen = (arena[0].view[2], arena[1].view[2])
+    closed = (arena[0].view[3], arena[1].view[3])
+    dis[0][start], prev[0][start], seen[0][start] = 0.0, -1, ep[0]
+    dis[1][end], prev[1][end], seen[1][end] = 0.0, -1, ep[1]
+    pq = ((IndexedHeap(), IndexedHeap()) if trace is None
+          else (trace.heap(), trace.heap()))
+    sign = (1.0, -1.0)
+    # both sides ask the potential of a node, compute it once per query
+    p = arena[0].cached(pot) if pot is not None else (lambda i: 0.0)
+    pq[0].push(start, p(start))
+    pq[1].push(end, -p(end))
+    mu = float('inf')
+    meet = -1
+    num_vised = 0
+    if trace is not None:
+        trace.phase('search')
+
+    while pq[0] and pq[1]:
+        if pq[0].peek()[0] + pq[1].peek()[0] >= mu:
+            break
+        # expand the side with the smaller heap top
+        side = 0 if pq[0].peek()[0] <= pq[1].peek()[0] else 1
+        other = 1 - side
+        _, nw = pq[side].pop()
+        ds, ps, ss, es = dis[side], prev[side], seen[side], ep[side]
+        closed[side][nw] = es
+        d = ds[nw]
+        off, tgt, wgt = adj[side]
+        for e in range(off[nw], off[nw+1]):
+            nxt = tgt[e]
+            if closed[side][nxt] == es:
+                continue
+            nd = d + wgt[e]
+            if ss[nxt] != es:
+                ss[nxt], ds[nxt], ps[nxt] = es, nd, nw
+                pq[side].push(nxt, nd + sign[side] * p(nxt))
+                num_vised+=1
+            elif nd < ds[nxt]:
+                ds[nxt], ps[nxt] = nd, nw
+                pq[side].decrease(nxt, nd + sign[side] * p(nxt))
+            else:
+                continue
+            # the two searches touch at nxt
+            if seen[other][nxt] == ep[other] and nd + dis[other][nxt] < mu:
+                mu = nd + dis[other][nxt]
+                meet = nxt
+
+    if meet == -1: # end can not be reached from start
+        return [], float('inf'), num_vised
+
+    if trace is not None:
+        trace.phase('path')
+    # end ... meet from the backward tree, then meet ... start
+    path = arena[1].path(end, meet)
+    path.reverse()
+    path += arena[0].path(start, meet)[1:]
+
+    return graph.node_ids(path), mu, num_vised
+
+
+def bidirectional_ucs(start, end, trace=None):
+    """
+    Bidirectional Dijkstra.  Returns (path, dist, num_visited) like ucs().
+    """
+    return _search(start, end, trace=trace)
+
+
+def bidirectional_astar(start, end, trace=None):
+    """
+    Bidirectional A*.  Returns (path, dist, num_visited) like astar().
+
+    The average potential (h_end - h_start) / 2 is used.  h_end bounds
+    the distance to end and h_start the distance from start, both from the
+    landmarks, and h_end also from heuristic.csv when end is a column.
+    """
+    s, t = graph.index(start), graph.index(end)
+    h_end = landmarks.bound(t, graph.heu[graph.dests.index(end)] if end in graph.dests else None)
+    # distance from start to i is the distance to start on the reverse graph
+    h_start = landmarks.reversed().bound(s)
+
+    def pot(i):
+        a, b = h_end(i), h_start(i)
+        # inf - inf only happens on nodes neither search can reach
+        return 0.0 if a == b else 0.5 * (a - b)
+
+    return _search(start, end, pot, trace)
+
+
+if __name__ == '__main__':
+    for search in (bidirectional_ucs, bidirectional_astar):
+        path, dist, num_visited = search(2270143902, 8513026827)
+        print(search.__name__)
+        print(f'The number of path nodes: {len(path)}')
+        print(f'Total distance of path: {dist}')
+        print(f'The number of visited nodes: {num_visited}')
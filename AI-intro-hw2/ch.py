@@ -0,0 +1,318 @@
+import heapq
+import os
+import numpy as np
+from arena import get_arena
+from graph import EDGE_FILE, file_stamp, load_graph, read_arrays, stamps_fresh, write_arrays
+from heap import IndexedHeap
+
+# witness searches give up after settling this many nodes, a missed
+# witness only costs an unneeded shortcut
+WITNESS_SETTLE_LIMIT = 60
+
+
+class Hierarchy:
+    """
+    A contraction hierarchy of a Graph.
+
+    rank[i] is the order in which index i was contracted.  up holds the
+    edges i -> j with rank[j] > rank[i] and down the edges j -> i with
+    rank[j] > rank[i] turned around, both as (offset, target, weight) CSR.
+    A shortcut u -> v that replaced the path u -> mid -> v is listed in
+    shortcut_u/shortcut_v/shortcut_mid so paths can be unpacked.
+    version is the graph.version it was built on, any later change of an
+    edge makes it stale.
+    """
+
+    def __init__(self, graph, rank, up, down, shortcuts, version=0):
+        self.graph = graph
+        self.version = version
+        self.rank = rank
+        self.up = up
+        self.down = down
+        self.shortcut_u, self.shortcut_v, self.shortcut_mid = shortcuts
+        self._mid = None
+        self._view = None
+
+    def num_shortcuts(self):
+        return len(self.shortcut_mid)
+
+    def view(self):
+        if self._view is None:
+            self._view = (tuple(memoryview(a) for a in self.up),
+                          tuple(memoryview(a) for a in self.down))
+        return self._view
+
+    def mid(self):
+        # shortcut (u, v) -> the node it skips, built on first use
+        if self._mid is None:
+            self._mid = dict(zip(zip(self.shortcut_u.tolist(), self.shortcut_v.tolist()),
+                                 self.shortcut_mid.tolist()))
+        return self._mid
+
+
+def _csr(n, src, dst, wgt):
+    src = np.asarray(src, dtype=np.int64)
+    order = np.argsort(src, kind='stable')
+    offset = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n), out=offset[1:])
+    return (offset, np.asarray(dst, dtype=np.int32)[order],
+            np.asarray(wgt, dtype=np.float64)[order])
+
+
+def build_hierarchy(graph):
+    """
+    Contracts every node of graph, the node with the smallest edge
+    difference (shortcuts added - edges removed + contracted neighbours)
+    first.  Priorities are updated lazily when a node reaches the top.
+    """
+    n = graph.num_nodes()
+    off, tgt, wgt = graph.view()
+
+    # remaining graph as dicts of the shortest edge between two nodes
+    out = [dict() for _ in range(n)]
+    inn = [dict() for _ in range(n)]
+    for u in range(n):
+        for e in range(off[u], off[u+1]):
+            v = tgt[e]
+            if v != u and wgt[e] < out[u].get(v, float('inf')):
+                out[u][v] = wgt[e]
+                inn[v][u] = wgt[e]
+
+    def witness(u, skip, limit):
+        # local Dijkstra from u avoiding skip, up to distance limit
+        dist = {u: 0.0}
+        pq = [(0.0, u)]
+        settled = 0
+        while pq and settled < WITNESS_SETTLE_LIMIT:
+            d, x = heapq.heappop(pq)
+            if d > dist[x]:
+                continue
+            if d > limit:
+                break
+            settled += 1
+            for y, w in out[x].items():
+                if y != skip and d + w < dist.get(y, float('inf')):
+                    dist[y] = d + w
+                    heapq.heappush(pq, (d + w, y))
+        return dist
+
+    def shortcuts(v):
+        # the (u, x, dis) shortcuts needed to contract v
+        sc = []
+        if not out[v]:
+            return sc
+        longest = max(out[v].values())
+        for u, wu in inn[v].items():
+            dist = witness(u, v, wu + longest)
+            for x, wx in out[v].items():
+                if x != u and wu + wx < dist.get(x, float('inf')):
+                    sc.append((u, x, wu + wx))
+        return sc
+
+    deleted = [0] * n
+    def priority(v):
+        return len(shortcuts(v)) - len(inn[v]) - len(out[v]) + deleted[v]
+
+    pq = [(priority(v), v) for v in range(n)]
+    heapq.heapify(pq)
+    rank = np.zeros(n, dtype=np.int32)
+    up, down, mid = [], [], dict()
+    r = 0
+    while pq:
+        _, v = heapq.heappop(pq)
+        p = priority(v)
+        if pq and p > pq[0][0]: # lazy update, v is not the best any more
+            heapq.heappush(pq, (p, v))
+            continue
+
+        rank[v] = r
+        r += 1
+        # every remaining neighbour is contracted later, so has higher rank
+        for x, w in out[v].items():
+            up.append((v, x, w))
+        for u, w in inn[v].items():
+            down.append((v, u, w))
+        for u, x, w in shortcuts(v):
+            if w < out[u].get(x, float('inf')):
+                out[u][x] = w
+                inn[x][u] = w
+                mid[(u, x)] = v
+        for x in out[v]:
+            del inn[x][v]
+            deleted[x] += 1
+        for u in inn[v]:
+            del out[u][v]
+            deleted[u] += 1
+        out[v], inn[v] = dict(), dict()
+
+    # only the shortcuts that made it into the hierarchy are kept
+    kept = [(u, x) for u, x, _ in up if (u, x) in mid]
+    kept += [(u, x) for x, u, _ in down if (u, x) in mid]
+    shortcut = (np.array([u for u, _ in kept], dtype=np.int32),
+                np.array([x for _, x in kept], dtype=np.int32),
+                np.array([mid[k] for k in kept], dtype=np.int32))
+    return Hierarchy(graph, rank,
+                     _csr(n, *zip(*up)) if up else _csr(n, [], [], []),
+                     _csr(n, *zip(*down)) if down else _csr(n, [], [], []),
+                     shortcut, graph.version)
+
+
+def ch_path_of(path):
+    # edges.csv -> edges.ch next to it
+    return os.path.splitext(path)[0] + '.ch'
+
+
+def save_hierarchy(ch, ch_path, meta):
+    arrays = {'rank': ch.rank}
+    for prefix, csr in (('up', ch.up), ('down', ch.down)):
+        for name, arr in zip(('offset', 'target', 'weight'), csr):
+            arrays[prefix + '_' + name] = arr
+    arrays['shortcut_u'] = ch.shortcut_u
+    arrays['shortcut_v'] = ch.shortcut_v
+    arrays['shortcut_mid'] = ch.shortcut_mid
+    write_arrays(ch_path, arrays, meta)
+
+
+def open_hierarchy(graph, ch_path):
+    opened = read_arrays(ch_path)
+    if opened is None:
+        return None
+    a, meta = opened
+    ch = Hierarchy(graph, a['rank'],
+                   (a['up_offset'], a['up_target'], a['up_weight']),
+                   (a['down_offset'], a['down_target'], a['down_weight']),
+                   (a['shortcut_u'], a['shortcut_v'], a['shortcut_mid']))
+    return ch, meta
+
+
+# hierarchies already loaded in this process, key is the path of the edge file
+_hierarchies = dict()
+
+
+def load_hierarchy(path=EDGE_FILE):
+    """
+    Returns the contraction hierarchy of the edge file.  It is read from the
+    shortcut file next to it (edges.ch), which is built and written first
+    when it is missing or older than the edge file.  Once edges of the
+    loaded graph changed (see dynamic.update_edges) it is built again for
+    the current weights, in memory only.
+    """
+    path = os.path.realpath(path)
+    ch = _hierarchies.get(path)
+    if ch is not None and ch.version == ch.graph.version:
+        return ch
+
+    graph = load_graph(path)
+    if graph.version != 0:
+        ch = build_hierarchy(graph)
+        _hierarchies[path] = ch
+        return ch
+    ch_path = ch_path_of(path)
+    opened = open_hierarchy(graph, ch_path)
+    if opened is None or not stamps_fresh(opened[1], [('edges', path)], ch_path):
+        opened = None # unmap the stale file before it is replaced
+        meta = {'edges': file_stamp(path)}
+        ch = build_hierarchy(graph)
+        try:
+            save_hierarchy(ch, ch_path, meta)
+        except OSError:
+            pass # can not write next to the csv, keep it in memory
+    else:
+        ch = opened[0]
+    _hierarchies[path] = ch
+    return ch
+
+
+def _unpack(mid, u, v, out):
+    # appends the original nodes of edge u -> v after u, v included
+    stack = [(u, v)]
+    while stack:
+        a, b = stack.pop()
+        m = mid.get((a, b))
+        if m is None:
+            out.append(b)
+        else:
+            stack.append((m, b))
+            stack.append((a, m))
+
+
+def ch_query(start, end, path=EDGE_FILE, trace=None):
+    """
+    Shortest path query on the contraction hierarchy.  Both searches only go
+    up in rank; the answer is the best node where they meet.
+    Returns (path, dist, num_visited) like ucs().
+    """
+    ch = load_hierarchy(path)
+    graph = ch.graph
+    start, end = graph.index(start), graph.index(end)
+    adj = ch.view()
+    # dis/prev from start / to end in the arenas of the two sides,
+    # an entry counts when its seen is the side's epoch
+    arena = (get_arena(graph, 0), get_arena(graph, 1))
+    ep = (arena[0].reset(), arena[1].reset())
+    dis = (arena[0].view[0], arena[1].view[0])
+    prev = (arena[0].view[1], arena[1].view[1])
+    seen = (arena[0].view[2], arena[1].view[2])
+    dis[0][start], prev[0][start], seen[0][start] = 0.0, -1, ep[0]
+    dis[1][end], prev[1][end], seen[1][end] = 0.0, -1, ep[1]
+    pq = ((IndexedHeap(), IndexedHeap()) if trace is None
+          else (trace.heap(), trace.heap()))
+    pq[0].push(start, 0.0)
+    pq[1].push(end, 0.0)
+    mu = float('inf')
+    meet = -1
+    num_vised = 0
+    if trace is not None:
+        trace.phase('search')
+
+    while True:
+        # a side is finished once its heap top can not beat mu,
+        # expand the unfinished side with the smaller heap top
+        live = [side for side in (0, 1) if pq[side] and pq[side].peek()[0] < mu]
+        if not live:
+            break
+        side = min(live, key=lambda side: pq[side].peek()[0])
+        d, nw = pq[side].pop()
+        num_vised += 1
+        other = 1 - side
+        if seen[other][nw] == ep[other] and d + dis[other][nw] < mu:
+            mu = d + dis[other][nw]
+            meet = nw
+        off, tgt, wgt = adj[side]
+        ds, ps, ss, es = dis[side], prev[side], seen[side], ep[side]
+        for e in range(off[nw], off[nw+1]):
+            nxt = tgt[e]
+            nd = d + wgt[e]
+            if ss[nxt] != es or nd < ds[nxt]:
+                ss[nxt], ds[nxt], ps[nxt] = es, nd, nw
+                pq[side].push(nxt, nd)
+
+    if meet == -1: # end can not be reached from start
+        return [], float('inf'), num_vised
+
+    if trace is not None:
+        trace.phase('path')
+    # start ... meet ... end in the hierarchy, then unpack the shortcuts
+    hops = arena[0].path(start, meet)
+    hops.reverse()
+    hops += arena[1].path(end, meet)[1:]
+    mid = ch.mid()
+    nodes = [start]
+    for u, v in zip(hops, hops[1:]):
+        _unpack(mid, u, v, nodes)
+    nodes.reverse() # end ... start like the other searchers
+
+    return graph.node_ids(nodes), mu, num_vised
+
+
+if __name__ == '__main__':
+    import time
+    t = time.time()
+    ch = load_hierarchy()
+    print(f'Hierarchy ready in {time.time() - t:.2f} s, {ch.num_shortcuts()} shortcuts')
+    t = time.time()
+    path, dist, num_visited = ch_query(2270143902, 8513026827)
+    print(f'Query took {(time.time() - t) * 1000:.2f} ms')
+    print(f'The number of path nodes: {len(path)}')
+    print(f'Total distance of path: {dist}')
+    print(f'The number of visited nodes: {num_visited}')
@@ -0,0 +1,113 @@
+"""
+Checks the repaired shortest path trees of dynamic.py against a Dijkstra
+from scratch after every batch of random edge updates.
+
+    python check_dynamic.py [edges.csv] --batches 30 --size 20 --seed 0
+
+A few trees by distance and by travel time are kept on the graph.  Each
+batch closes, lengthens, shortens or changes the speed limit of --size
+random road segments with update_edges, then every tree must have the
+distances shortest_path_tree computes on the changed graph, and every
+prev edge must account for its node's distance.
+"""
+import argparse
+import sys
+import numpy as np
+from dijkstra import shortest_path_tree
+from dynamic import tree, update_edges
+from graph import EDGE_FILE, load_graph
+
+SOURCES = 3
+
+
+def random_batch(graph, size, rnd):
+    """
+    (pairs, distance, speed) for one update_edges call, distance and speed
+    hold one value per pair, nan where that pair keeps its value.
+    """
+    edges = rnd.choice(graph.num_edges(), size, replace=False)
+    src = np.searchsorted(graph.offset, edges, side='right') - 1
+    pairs, distance, speed = [], [], []
+    for u, v in set(zip(src.tolist(), np.asarray(graph.target)[edges].tolist())):
+        found = graph.edges_between(u, v)
+        w, s = float(np.min(graph.weight[found])), float(np.max(graph.speed[found]))
+        kind = rnd.integers(4)
+        if kind == 0:   # closed
+            d, s = float('inf'), 0.0
+        elif kind == 1: # detour
+            d, s = w * rnd.uniform(1.0, 3.0), float('nan')
+        elif kind == 2: # reopened or a new short cut
+            d, s = w * rnd.uniform(0.3, 1.0), float('nan')
+        else:           # new speed limit
+            d, s = float('nan'), float(rnd.choice([20.0, 40.0, 60.0, 80.0]))
+        pairs.append((int(graph.ids[u]), int(graph.ids[v])))
+        distance.append(d)
+        speed.append(s)
+    return pairs, np.array(distance), np.array(speed)
+
+
+def apply_batch(graph, path, pairs, distance, speed):
+    # update_edges takes one value per pair, so keep the current one where
+    # the batch leaves it alone
+    for i, (s, t) in enumerate(pairs):
+        found = graph.edges_between(graph.index(s), graph.index(t))
+        if np.isnan(distance[i]):
+            distance[i] = float(np.min(graph.weight[found]))
+        if np.isnan(speed[i]):
+            speed[i] = float(np.max(graph.speed[found]))
+    return update_edges(pairs, distance=distance, speed=speed, path=path)
+
+
+def mismatch(t):
+    """
+    What is wrong with the tree t, or None if it matches a new Dijkstra.
+    """
+    graph = t.graph
+    arena, _ = shortest_path_tree(graph, t.source)
+    done = arena.closed == arena.epoch
+    expect = np.where(done, arena.dist, np.inf)
+    if not np.allclose(t.dist, expect, rtol=1e-9, atol=1e-6):
+        bad = int(np.flatnonzero(~np.isclose(t.dist, expect, rtol=1e-9, atol=1e-6))[0])
+        return f'index {bad}: repaired {t.dist[bad]}, dijkstra {expect[bad]}'
+    # the best edge prev[v] -> v has to give the distance of v
+    src = np.repeat(np.arange(graph.num_nodes()), np.diff(graph.offset))
+    tgt = np.asarray(graph.target)
+    via = np.full(graph.num_nodes(), np.inf)
+    tree_edge = t.prev[tgt] == src
+    np.minimum.at(via, tgt[tree_edge], t.dist[src[tree_edge]] + graph.weight[tree_edge])
+    via[t.source] = 0.0
+    bad = np.flatnonzero(~np.isclose(via, t.dist, rtol=1e-9, atol=1e-6))
+    if len(bad):
+        return f'index {bad[0]}: prev {t.prev[bad[0]]} does not give its distance'
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('edges', nargs='?', default=EDGE_FILE)
+    parser.add_argument('--batches', type=int, default=30)
+    parser.add_argument('--size', type=int, default=20, help='road segments per batch')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rnd = np.random.default_rng(args.seed)
+    graph = load_graph(args.edges)
+    sources = rnd.choice(graph.ids, SOURCES, replace=False).tolist()
+    trees = [tree(s, timed, args.edges) for s in sources for timed in (False, True)]
+
+    for b in range(args.batches):
+        pairs, distance, speed = random_batch(graph, args.size, rnd)
+        num = apply_batch(graph, args.edges, pairs, distance, speed)
+        for t in trees:
+            wrong = mismatch(t)
+            if wrong is not None:
+                kind = 'time' if t.graph is graph._timed else 'distance'
+                print(f'batch {b}, {kind} tree from {int(graph.ids[t.source])}: {wrong}')
+                return 1
+        print(f'batch {b}: {len(pairs)} segments, {num} nodes settled again')
+    print(f'ok: {args.batches} batches, {len(trees)} trees match dijkstra')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
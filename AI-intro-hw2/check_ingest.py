@@ -0,0 +1,78 @@
+"""
+Checks that the streaming ingest (ingest.py) writes the same graph cache
+as compile_graph (graph.py), byte for byte, when the edge file is not
+sorted.
+
+    python check_ingest.py [edges.csv] --rows 5000 --seed 0
+
+The rows of the edge file are shuffled into a temporary directory, with
+heuristic.csv copied next to them if there is one, and both caches are
+written there and compared.  A small --rows makes ingest merge many runs.
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+from graph import EDGE_FILE, compile_graph, heuristic_path_of, read_arrays
+from ingest import ingest
+
+
+def shuffled_copy(path, out, seed):
+    # the header stays first, the rows are written in random order
+    with open(path, newline='') as f:
+        header, *rows = f.readlines()
+    random.Random(seed).shuffle(rows)
+    with open(out, 'w', newline='') as f:
+        f.write(header)
+        f.writelines(rows)
+
+
+def first_difference(a, b):
+    """
+    Name of the first array (or 'meta') that differs between the caches
+    a and b, None if they hold the same.
+    """
+    (xa, ma), (xb, mb) = read_arrays(a), read_arrays(b)
+    for name in sorted(set(xa) | set(xb)):
+        if name not in xa or name not in xb:
+            return name
+        if (xa[name].dtype != xb[name].dtype or xa[name].shape != xb[name].shape
+                or xa[name].tobytes() != xb[name].tobytes()):
+            return name
+    return 'meta' if ma != mb else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('edges', nargs='?', default=EDGE_FILE)
+    parser.add_argument('--rows', type=int, default=5000,
+                        help='rows per sorted run of ingest')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'edges.csv')
+        shuffled_copy(args.edges, path, args.seed)
+        heuristic_path = heuristic_path_of(os.path.realpath(args.edges))
+        if heuristic_path is not None:
+            shutil.copy(heuristic_path, os.path.join(tmp, 'heuristic.csv'))
+
+        compiled, ingested = os.path.join(tmp, 'compiled.graph'), os.path.join(tmp, 'ingested.graph')
+        compile_graph(path, cache_path=compiled)
+        n, m = ingest(path, cache_path=ingested, rows=args.rows)
+        with open(compiled, 'rb') as f:
+            a = f.read()
+        with open(ingested, 'rb') as f:
+            b = f.read()
+        if a == b:
+            print(f'ok: {n} nodes, {m} edges, {len(a)} identical bytes')
+            return 0
+        print(f'caches differ ({len(a)} and {len(b)} bytes), first in: '
+              f'{first_difference(compiled, ingested)}')
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,66 +1,60 @@
-import csv
-import os
+from arena import get_arena
+from graph import load_graph
 
-# please put this python in the same folder as edges.csv
-py_dir = os.path.dirname(os.path.realpath(__file__))
-edgeFile = open(py_dir+'\\edges.csv', newline='')
-rws = csv.DictReader(edgeFile)
+graph = load_graph()
 
-# use dict to store edges 
-# key is start. And value is a 2d-list
-# [[end, dis, spd_lim], ...]
-edges = dict()
-lis = list()
-prev = -1
-for rw in rws:
-    # because edges.csv is sorted by start node, this way is okay
-    if int(rw['start']) != prev:
-        edges[prev] = lis
-        prev = int(rw['start'])
-        lis = list() # initialize
-
-    lis.append([int(rw['end']), float(rw['distance']), float(rw['speed limit'])])
-edgeFile.close() # data are stored in edges, thus close the file
-
-# use dict to store path (ans)
-# key is the end node, value is a list
-# distance from start to this node and the previous node in this path
-def dfs(start, end):
+# use the arena (see arena.py) to store path
+# dis[i] is the distance from start to index i and prev[i]
+# the previous node in this path, valid once seen[i] == ep
+def dfs(start, end, trace=None):
     # Begin your code (Part 2)
 
     # initialize
-    ans = dict()
-    ans[start] = [0.0, -1]# the distance from start to start is 0
+    off, tgt, wgt = graph.view()
+    start, end = graph.index(start), graph.index(end)
+    if start == end:
+        return graph.node_ids([start]), 0.0, 0
+    arena = get_arena(graph)
+    ep = arena.reset()
+    dis, prev, seen, _ = arena.view
+    dis[start], prev[start], seen[start] = 0.0, -1, ep# the distance from start to start is 0
     nw = start
     stk = list()
     num_vised = 0
     done = False
     path = list()
+    if trace is not None:
+        trace.phase('search')
 
     while not done:
-        for next in edges[nw]: # next is a list [end, dis, spd_lim]
-            if next[0] in edges: # if there is edge started from this node
-                if next[0] != end and next[0] not in ans:
+        for e in range(off[nw], off[nw+1]): # e is the index of edge (nw, tgt[e])
+            nxt = tgt[e]
+            if off[nxt] != off[nxt+1]: # if there is edge started from this node
+                if nxt != end and seen[nxt] != ep:
                     # works when not achieve to final node 
                     # and this node has not been visited yet
-                    stk.append(next[0])
-                    ans[next[0]] = [ans[nw][0] + next[1], nw]# update the distance and num_node
+                    stk.append(nxt)
+                    if trace is not None:
+                        trace.push()
+                    seen[nxt], dis[nxt], prev[nxt] = ep, dis[nw] + wgt[e], nw# update the distance and num_node
                     num_vised+=1
-                elif next[0]==end: # reach the end
-                    ans[next[0]] = [ans[nw][0] + next[1], nw]
+                elif nxt==end: # reach the end
+                    seen[nxt], dis[nxt], prev[nxt] = ep, dis[nw] + wgt[e], nw
+                    if trace is not None:
+                        trace.phase('path')
                     # to get the path by reversing back
-                    back = end
-                    path.append(back)
-                    while ans[back][1] != start:
-                        path.append(ans[back][1])
-                        back = ans[back][1]
-                    path.append(start)
+                    path = arena.path(start, end)
                     done = True
                     num_vised+=1
-        nw = stk[-1]
-        stk.pop()
+        if not done:
+            if not stk: # end can not be reached from start
+                return path, float('inf'), num_vised
+            nw = stk[-1]
+            stk.pop()
+            if trace is not None:
+                trace.pop(nw, dis[nw])
 
-    return path, ans[end][0], num_vised
+    return graph.node_ids(path), dis[end], num_vised
     # End your code (Part 2)
 
 
@@ -0,0 +1,51 @@
+import heapq
+from arena import get_arena
+
+# One-to-many Dijkstra, the building block of batch routing (batch.py),
+# landmarks (alt.py), reachability (reach.py) and repairable trees
+# (dynamic.py).
+
+
+def shortest_path_tree(graph, source, targets=None, budget=None, trace=None):
+    """
+    Dijkstra from the index source.  Stops once every index in targets is
+    settled (or runs to the end when targets is None), and never settles
+    an index farther than budget.
+    The tree is left in the arena of graph (see arena.py) and can be read
+    from it until the next search on graph.  Returns (arena, num_visited).
+    With a trace (see instrument.py) the queue reports to it.
+    """
+    off, tgt, wgt = graph.view()
+    arena = get_arena(graph)
+    ep = arena.reset()
+    dis, prev, seen, closed = arena.view
+    dis[source], prev[source], seen[source] = 0.0, -1, ep
+    left = None if targets is None else set(targets)
+    budget = float('inf') if budget is None else budget
+    hq = heapq if trace is None else trace.heapq()
+    pq = []
+    hq.heappush(pq, (0.0, source))
+    num_vised = 0
+    if trace is not None:
+        trace.phase('search')
+
+    while pq:
+        d, nw = hq.heappop(pq)
+        if closed[nw] == ep: # stale entry, nw was settled by a shorter one
+            continue
+        if d > budget:
+            break
+        closed[nw] = ep
+        num_vised += 1
+        if left is not None:
+            left.discard(nw)
+            if not left:
+                break
+        for e in range(off[nw], off[nw+1]):
+            nxt = tgt[e]
+            nd = d + wgt[e]
+            if seen[nxt] != ep or nd < dis[nxt]:
+                seen[nxt], dis[nxt], prev[nxt] = ep, nd, nw
+                hq.heappush(pq, (nd, nxt))
+
+    return arena, num_vised
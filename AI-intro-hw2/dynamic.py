@@ -0,0 +1,185 @@
+import heapq
+import weakref
+import numpy as np
+from dijkstra import shortest_path_tree
+from graph import EDGE_FILE, load_graph
+
+# Live edge updates (closures, changed speed limits) on the loaded graph.
+#
+# update_edges() changes the edges in place (see Graph.set_edges), so the
+# next ucs()/astar_time() call already searches the new weights, and
+# repairs every ShortestPathTree kept on the graph instead of recomputing
+# it: only the nodes whose distance actually changes are visited again.
+#
+# The landmarks and the contraction hierarchy (alt.py, ch.py) notice the
+# change through graph.version: landmark distances are measured again
+# after an edge got shorter or faster (longer edges keep the bounds
+# admissible), and the hierarchy is built again, in memory, after any
+# change.  Both happen at the next query that uses them.
+
+# live trees of every graph, repaired by update_edges
+_trees = weakref.WeakKeyDictionary()
+
+
+class ShortestPathTree:
+    """
+    Distance and previous index of every index from the index source,
+    inf and -1 where it can not be reached.
+    """
+
+    def __init__(self, graph, source):
+        self.graph = graph
+        self.source = source
+        arena, _ = shortest_path_tree(graph, source)
+        done = arena.closed == arena.epoch
+        self.dist = np.where(done, arena.dist, np.inf)
+        self.prev = np.where(done, arena.prev, -1).astype(np.int32)
+        self.version = graph.version
+        _trees.setdefault(graph, weakref.WeakSet()).add(self)
+
+    def path(self, end):
+        """
+        Node ids from the index end back to the source, like the searchers
+        return their paths, [] if end can not be reached.
+        """
+        if self.dist[end] == np.inf:
+            return []
+        prev = memoryview(self.prev)
+        path = [end]
+        while path[-1] != self.source:
+            path.append(prev[path[-1]])
+        return self.graph.node_ids(path)
+
+    def repair(self, edges, old, trace=None):
+        """
+        Brings the tree up to date after the weights of the edge positions
+        edges changed from old to their current value.  Returns the number
+        of nodes settled again.
+
+        Nodes below an edge of the tree that got longer lose their distance
+        and take the best one offered by their other in edges, the end of an
+        edge that got shorter takes the shorter distance; from these nodes a
+        Dijkstra passes the changes on as far as they improve anything.
+        """
+        graph = self.graph
+        off, tgt, wgt = graph.view()
+        roff, rtgt, rwgt = graph.reverse().view()
+        dist, prev = memoryview(self.dist), memoryview(self.prev)
+        edges = np.asarray(edges, dtype=np.int64)
+        src = (np.searchsorted(graph.offset, edges, side='right') - 1).tolist()
+        changes = list(zip(edges.tolist(), src, np.asarray(old).tolist()))
+
+        # subtrees hanging below tree edges that got longer
+        lost = []
+        for e, u, w0 in changes:
+            v = tgt[e]
+            if wgt[e] > w0 and prev[v] == u and dist[u] + w0 == dist[v]:
+                lost.append(v)
+        affected = set()
+        while lost:
+            x = lost.pop()
+            if x in affected:
+                continue
+            affected.add(x)
+            for e in range(off[x], off[x+1]):
+                if prev[tgt[e]] == x:
+                    lost.append(tgt[e])
+        for x in affected:
+            dist[x], prev[x] = float('inf'), -1
+
+        hq = heapq if trace is None else trace.heapq()
+        pq = []
+        for x in affected:
+            for e in range(roff[x], roff[x+1]):
+                nd = dist[rtgt[e]] + rwgt[e]
+                if nd < dist[x]:
+                    dist[x], prev[x] = nd, rtgt[e]
+            if dist[x] != float('inf'):
+                hq.heappush(pq, (dist[x], x))
+        for e, u, w0 in changes:
+            v = tgt[e]
+            nd = dist[u] + wgt[e]
+            if nd < dist[v]:
+                dist[v], prev[v] = nd, u
+                hq.heappush(pq, (nd, v))
+
+        num_settled = 0
+        if trace is not None:
+            trace.phase('search')
+        while pq:
+            d, x = hq.heappop(pq)
+            if d > dist[x]: # stale entry
+                continue
+            num_settled += 1
+            for e in range(off[x], off[x+1]):
+                nxt = tgt[e]
+                nd = d + wgt[e]
+                if nd < dist[nxt]:
+                    dist[nxt], prev[nxt] = nd, x
+                    hq.heappush(pq, (nd, nxt))
+
+        self.version = graph.version
+        return num_settled
+
+
+def tree(source, timed=False, path=EDGE_FILE):
+    """
+    A ShortestPathTree from the node id source, by distance or by travel
+    time, kept up to date by update_edges.
+    """
+    graph = load_graph(path)
+    graph = graph.timed() if timed else graph
+    return ShortestPathTree(graph, graph.index(source))
+
+
+def update_edges(pairs, distance=None, speed=None, path=EDGE_FILE):
+    """
+    Changes the road segments pairs, given as (start, end) node ids, to the
+    new distance (meters) and/or speed limit (km/h), each either one value
+    for all of them or one per pair.  Every edge between a pair is changed,
+    KeyError if there is none.  Speed 0 (or distance inf) closes a road.
+
+    Returns the number of nodes the repair of the live trees settled.
+    """
+    graph = load_graph(path)
+    edges, where = [], []
+    for i, (s, t) in enumerate(pairs):
+        found = graph.edges_between(graph.index(s), graph.index(t))
+        if len(found) == 0:
+            raise KeyError((s, t))
+        edges.append(found)
+        where.append(np.full(len(found), i))
+    if not edges: # nothing to change
+        return 0
+    edges = np.concatenate(edges)
+    where = np.concatenate(where)
+    if distance is not None:
+        distance = np.broadcast_to(np.asarray(distance, dtype=np.float64), len(pairs))[where]
+    if speed is not None:
+        speed = np.broadcast_to(np.asarray(speed, dtype=np.float32), len(pairs))[where]
+
+    # weights before the change, for the trees of graph and graph.timed()
+    olds = [(g, np.array(g.weight[edges])) for g in (graph, graph._timed)
+            if g is not None and _trees.get(g)]
+    graph.set_edges(edges, weight=distance, speed=speed)
+
+    num_settled = 0
+    for g, old in olds:
+        for t in list(_trees[g]):
+            num_settled += t.repair(edges, old)
+    return num_settled
+
+
+if __name__ == '__main__':
+    import time
+    graph = load_graph()
+    t = tree(2270143902)
+    end = graph.index(1079387396)
+    print(f'distance before: {t.dist[end]}')
+    # close a road in the middle of the route
+    route = t.path(end)[::-1]
+    mid = len(route) // 2
+    tic = time.time()
+    num = update_edges([(route[mid], route[mid + 1])], distance=float('inf'))
+    print(f'repaired in {(time.time() - tic) * 1000:.1f} ms, {num} nodes settled again')
+    print(f'distance after: {t.dist[end]}')
@@ -0,0 +1,527 @@
+import csv
+import hashlib
+import json
+import os
+import struct
+import numpy as np
+
+# please put this python in the same folder as edges.csv, or point
+# HW2_EDGE_FILE at another edge file (heuristic.csv is read next to it)
+py_dir = os.path.dirname(os.path.realpath(__file__))
+EDGE_FILE = os.environ.get('HW2_EDGE_FILE') or os.path.join(py_dir, 'edges.csv')
+HEURISTIC_FILE = os.path.join(os.path.dirname(EDGE_FILE), 'heuristic.csv')
+
+
+class Graph:
+    """
+    Road graph stored in compressed-sparse-row (CSR) form.
+
+    Nodes are renumbered to 0..n-1 in increasing order of their id, so
+    ids[i] is the original node id of index i.  The out edges of index i
+    are offset[i]:offset[i+1] of the target/weight/speed arrays.
+    """
+
+    def __init__(self, ids, offset, target, weight, speed):
+        self.ids = ids          # index -> node id (int64, sorted)
+        self.offset = offset    # int64, length n+1
+        self.target = target    # int32 index of the end node
+        self.weight = weight    # float64 distance in meters
+        self.speed = speed      # float32 speed limit in km/h
+        # heuristic.csv, see read_heuristic
+        self.dests = []
+        self.heu = None
+        self._view = None
+        self._reverse = None
+        self._rev_pos = None    # edge position in _reverse of every edge
+        self._timed = None
+        self._max_speed = None  # (version, m/s) of max_speed
+        self.version = 0        # bumped by every set_edges
+        self.shortened = 0      # version of the last one that shortened an edge
+
+    def num_nodes(self):
+        return len(self.ids)
+
+    def num_edges(self):
+        return len(self.target)
+
+    def index(self, node):
+        """
+        Maps an original node id to its index, KeyError if not in the graph.
+        """
+        i = int(np.searchsorted(self.ids, node))
+        if i == len(self.ids) or self.ids[i] != node:
+            raise KeyError(node)
+        return i
+
+    def node_ids(self, indices):
+        """
+        Maps a list of indices back to a list of original node ids.
+        """
+        return self.ids[np.asarray(indices, dtype=np.int64)].tolist()
+
+    def view(self):
+        """
+        Returns (offset, target, weight) as memoryviews.  Indexing a
+        memoryview gives plain python numbers, which keeps the search
+        loops as fast as with lists but without a copy of the arrays.
+        """
+        if self._view is None:
+            self._view = (memoryview(self.offset), memoryview(self.target),
+                          memoryview(self.weight))
+        return self._view
+
+    def timed(self):
+        """
+        Returns the Graph of the same edges weighted by travel time in
+        seconds (distance / speed limit) instead of meters.  Built on first use.
+        """
+        if self._timed is None:
+            mps = np.asarray(self.speed, dtype=np.float64) / 3.6
+            self._timed = Graph(self.ids, self.offset, self.target,
+                                np.asarray(self.weight) / mps, self.speed)
+            # any change so far may have made a trip faster
+            self._timed.version = self._timed.shortened = self.version
+        return self._timed
+
+    def max_speed(self):
+        """
+        The highest speed limit of the network in m/s.
+        """
+        if self._max_speed is None or self._max_speed[0] != self.version:
+            fastest = float(np.max(self.speed)) / 3.6 if self.num_edges() else 1.0
+            self._max_speed = (self.version, fastest)
+        return self._max_speed[1]
+
+    def reverse(self):
+        """
+        Returns the Graph with every edge turned around, so the out edges
+        of index i in it are the in edges of i here.  Built on first use.
+        """
+        if self._reverse is None:
+            n = self.num_nodes()
+            src = np.repeat(np.arange(n, dtype=np.int32), np.diff(self.offset))
+            order = np.argsort(self.target, kind='stable')
+            offset = np.zeros(n + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self.target, minlength=n), out=offset[1:])
+            self._reverse = Graph(self.ids, offset, src[order],
+                                  np.asarray(self.weight)[order],
+                                  np.asarray(self.speed)[order])
+            self._reverse.version = self.version
+            self._reverse.shortened = self.shortened
+            self._rev_pos = np.empty(len(order), dtype=np.int64)
+            self._rev_pos[order] = np.arange(len(order))
+        return self._reverse
+
+    def edges_between(self, start, end):
+        """
+        Positions of the edges from index start to index end (there may be
+        more than one, or none).
+        """
+        lo, hi = int(self.offset[start]), int(self.offset[start + 1])
+        return lo + np.flatnonzero(np.asarray(self.target[lo:hi]) == end)
+
+    def set_edges(self, edges, weight=None, speed=None):
+        """
+        Changes the distance (weight) and/or speed limit of the edges at
+        the positions edges in place, keeping timed() and reverse() in step,
+        and bumps version (and sets shortened to it when an edge got
+        shorter).  A memory-mapped graph gets its own copy of the weight
+        and speed arrays first, the cache file is never written.
+        """
+        edges = np.asarray(edges, dtype=np.int64)
+        old = np.array(self.weight[edges])
+        self._own()
+        if weight is not None:
+            self.weight[edges] = weight
+        if speed is not None:
+            self.speed[edges] = speed
+        if self._reverse is not None:
+            rev = self._reverse
+            rev._own()
+            rev.weight[self._rev_pos[edges]] = self.weight[edges]
+            rev.speed[self._rev_pos[edges]] = self.speed[edges]
+        if self._timed is not None:
+            self._timed.speed = self.speed
+            mps = self.speed[edges].astype(np.float64) / 3.6
+            with np.errstate(divide='ignore'):  # speed 0 closes the road
+                self._timed.set_edges(edges, weight=self.weight[edges] / mps)
+        self.version += 1
+        if np.any(self.weight[edges] < old):
+            self.shortened = self.version
+        if self._reverse is not None:
+            self._reverse.version = self.version
+            self._reverse.shortened = self.shortened
+
+    def _own(self):
+        if not self.weight.flags.writeable or isinstance(self.weight, np.memmap):
+            self.weight = np.array(self.weight)
+        if not self.speed.flags.writeable or isinstance(self.speed, np.memmap):
+            self.speed = np.array(self.speed)
+        self._view = None
+
+
+def build_graph(start, end, dis, spd):
+    """
+    Builds a Graph from parallel edge arrays (start id, end id, distance, speed).
+    The edges do not need to be sorted.
+    """
+    start = np.asarray(start, dtype=np.int64)
+    end = np.asarray(end, dtype=np.int64)
+    ids = np.unique(np.concatenate((start, end)))
+
+    # stable sort keeps the file order of edges leaving the same node
+    order = np.argsort(start, kind='stable')
+    src = np.searchsorted(ids, start[order])
+    offset = np.zeros(len(ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=len(ids)), out=offset[1:])
+
+    target = np.searchsorted(ids, end[order]).astype(np.int32)
+    weight = np.asarray(dis, dtype=np.float64)[order]
+    speed = np.asarray(spd, dtype=np.float32)[order]
+    return Graph(ids, offset, target, weight, speed)
+
+
+def read_edges(path=EDGE_FILE):
+    """
+    Reads edges.csv into a Graph.
+    """
+    start, end, dis, spd = [], [], [], []
+    with open(path, newline='') as edgeFile:
+        for rw in csv.DictReader(edgeFile):
+            start.append(int(rw['start']))
+            end.append(int(rw['end']))
+            dis.append(float(rw['distance']))
+            spd.append(float(rw['speed limit']))
+    return build_graph(start, end, dis, spd)
+
+
+def read_heuristic(graph, path=HEURISTIC_FILE):
+    """
+    Reads heuristic.csv.  Returns (dests, heu) where dests are the node ids
+    of its columns and heu[k][i] is the straight-line distance from index i
+    to dests[k].
+    """
+    with open(path, newline='') as heuristicFile:
+        rws_heu = csv.reader(heuristicFile)
+        dests = [int(d) for d in next(rws_heu)[1:]]
+        heu = np.zeros((len(dests), graph.num_nodes()), dtype=np.float64)
+        for rwh in rws_heu:
+            heu[:, graph.index(int(rwh[0]))] = [float(x) for x in rwh[1:]]
+    return dests, heu
+
+
+#################################################
+# Binary cache of the graph (and heuristic.csv) #
+#################################################
+
+# The cache file is laid out as
+#   magic, version, header position          (CACHE_PREFIX)
+#   the arrays, each aligned to 64 bytes
+#   a json header: {"arrays": {name: [dtype, shape, pos]}, "meta": {...}}
+# The header goes last so the arrays can be written without knowing their
+# sizes in advance.  Every array is opened again with np.memmap, so loading
+# the cache costs nothing until the pages are actually touched.
+CACHE_MAGIC = b'RDGRAPH\0'
+CACHE_VERSION = 1
+CACHE_PREFIX = struct.Struct('<8sIIQ')
+ALIGN = 64
+
+
+class ArrayWriter:
+    """
+    Writes named arrays into a cache file, see read_arrays.
+    The file only appears under its name once close() succeeds.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp = '%s.%d.tmp' % (path, os.getpid())
+        self.file = open(self.tmp, 'wb')
+        self.file.write(CACHE_PREFIX.pack(CACHE_MAGIC, CACHE_VERSION, 0, 0))
+        self.arrays = dict()
+
+    def _align(self):
+        pos = self.file.tell()
+        pad = -pos % ALIGN
+        self.file.write(b'\0' * pad)
+        return pos + pad
+
+    def add(self, name, arr):
+        arr = np.ascontiguousarray(arr)
+        pos = self._align()
+        self.file.write(arr.tobytes())
+        self.arrays[name] = [arr.dtype.str, list(arr.shape), pos]
+
+    def reserve(self, name, dtype, shape):
+        """
+        Makes room for an array that is filled later, returns it mapped
+        writable so it can be written piece by piece (see ingest.py).
+        """
+        dtype = np.dtype(dtype)
+        pos = self._align()
+        end = pos + dtype.itemsize * int(np.prod(shape))
+        self.file.truncate(end)
+        self.file.seek(end)
+        self.file.flush()
+        self.arrays[name] = [dtype.str, list(shape), pos]
+        if end == pos:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(self.tmp, dtype=dtype, mode='r+', offset=pos, shape=tuple(shape))
+
+    def close(self, meta=None):
+        try:
+            header = json.dumps({'arrays': self.arrays, 'meta': meta or {}}).encode()
+            pos = self._align()
+            self.file.write(header)
+            self.file.seek(0)
+            self.file.write(CACHE_PREFIX.pack(CACHE_MAGIC, CACHE_VERSION, 0, pos))
+            self.file.close()
+            os.replace(self.tmp, self.path)
+        except BaseException:
+            self.abort()
+            raise
+
+    def abort(self):
+        self.file.close()
+        try:
+            os.remove(self.tmp)
+        except OSError:
+            pass
+
+
+def write_arrays(path, arrays, meta=None):
+    """
+    Writes the dict arrays of name -> array into a cache file at path.
+    """
+    w = ArrayWriter(path)
+    try:
+        for name, arr in arrays.items():
+            w.add(name, arr)
+    except BaseException:
+        w.abort()
+        raise
+    w.close(meta)
+
+
+def read_arrays(path, mode='r'):
+    """
+    Opens a cache file written by ArrayWriter.  Returns (arrays, meta) where
+    arrays maps each name to an np.memmap, or None if the file is missing,
+    truncated or from another CACHE_VERSION.
+    """
+    try:
+        with open(path, 'rb') as f:
+            magic, version, _, pos = CACHE_PREFIX.unpack(f.read(CACHE_PREFIX.size))
+            if magic != CACHE_MAGIC or version != CACHE_VERSION or pos == 0:
+                return None
+            f.seek(pos)
+            header = json.loads(f.read())
+    except (OSError, struct.error, ValueError):
+        return None
+
+    arrays = dict()
+    for name, (dtype, shape, offset) in header['arrays'].items():
+        if 0 in shape:  # np.memmap can not map an empty array
+            arrays[name] = np.zeros(shape, dtype=dtype)
+        else:
+            arrays[name] = np.memmap(path, dtype=dtype, mode=mode,
+                                     offset=offset, shape=tuple(shape))
+    return arrays, header['meta']
+
+
+def file_stamp(path):
+    """
+    Size, mtime and sha1 of a source file, stored in the cache meta.
+    """
+    st = os.stat(path)
+    return {'size': st.st_size, 'mtime': st.st_mtime_ns, 'sha1': file_digest(path)}
+
+
+def file_digest(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def is_fresh(stamp, path):
+    """
+    Whether a source file still matches the stamp it had when the cache was
+    written.  The file is only hashed again when its mtime has changed, and
+    if the content is still the same the new mtime is put into stamp.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    if stamp['size'] != st.st_size:
+        return False
+    if stamp['mtime'] == st.st_mtime_ns:
+        return True
+    if stamp['sha1'] != file_digest(path):
+        return False
+    stamp['mtime'] = st.st_mtime_ns
+    return True
+
+
+def write_meta(path, meta):
+    """
+    Replaces the meta of a cache file in place.  The header is written over
+    the old one (padded with blanks when shorter), the arrays before it do
+    not move and the file is never cut, so maps of it stay valid.
+    """
+    with open(path, 'r+b') as f:
+        _, _, _, pos = CACHE_PREFIX.unpack(f.read(CACHE_PREFIX.size))
+        f.seek(pos)
+        old = f.read()
+        header = json.loads(old)
+        header['meta'] = meta
+        f.seek(pos)
+        f.write(json.dumps(header).encode().ljust(len(old)))
+
+
+def stamps_fresh(meta, sources, cache_path):
+    """
+    Whether every source file in sources, a list of (key, path), still
+    matches its stamp meta[key].  Files that were only touched get their
+    new mtime written into the cache at cache_path, so the next start does
+    not hash them again.
+    """
+    touched = False
+    for key, path in sources:
+        if key not in meta:
+            return False
+        mtime = meta[key]['mtime']
+        if not is_fresh(meta[key], path):
+            return False
+        touched = touched or meta[key]['mtime'] != mtime
+    if touched:
+        try:
+            write_meta(cache_path, meta)
+        except (OSError, ValueError):
+            pass # can not write next to the csv, hash again next time
+    return True
+
+
+def cache_path_of(path):
+    # edges.csv -> edges.graph next to it
+    return os.path.splitext(path)[0] + '.graph'
+
+
+def heuristic_path_of(path):
+    # heuristic.csv lives next to edges.csv, it is optional
+    heuristic_path = os.path.join(os.path.dirname(path), 'heuristic.csv')
+    return heuristic_path if os.path.exists(heuristic_path) else None
+
+
+def read_sources(path, heuristic_path):
+    """
+    Parses edges.csv and heuristic.csv (if any).  Returns (graph, meta)
+    where meta stamps the source files for the cache.
+    """
+    meta = {'edges': file_stamp(path)}
+    graph = read_edges(path)
+    if heuristic_path is not None:
+        meta['heuristic'] = file_stamp(heuristic_path)
+        graph.dests, graph.heu = read_heuristic(graph, heuristic_path)
+        meta['dests'] = graph.dests
+    return graph, meta
+
+
+def write_graph(graph, meta, cache_path):
+    arrays = {name: getattr(graph, name) for name in ('ids', 'offset', 'target', 'weight', 'speed')}
+    if graph.heu is not None:
+        arrays['heu'] = graph.heu
+    write_arrays(cache_path, arrays, meta)
+
+
+def compile_graph(path=EDGE_FILE, heuristic_path=None, cache_path=None):
+    """
+    Parses the csv files and writes the binary cache of them.
+    Returns the (in memory) Graph that was written.
+    """
+    path = os.path.realpath(path)
+    if heuristic_path is None:
+        heuristic_path = heuristic_path_of(path)
+    if cache_path is None:
+        cache_path = cache_path_of(path)
+    graph, meta = read_sources(path, heuristic_path)
+    write_graph(graph, meta, cache_path)
+    return graph
+
+
+def open_graph(cache_path, mode='r'):
+    """
+    Memory-maps a compiled graph.  Returns (graph, meta) or None.
+    """
+    opened = read_arrays(cache_path, mode)
+    if opened is None:
+        return None
+    arrays, meta = opened
+    graph = Graph(arrays['ids'], arrays['offset'], arrays['target'],
+                  arrays['weight'], arrays['speed'])
+    if 'heu' in arrays:
+        graph.dests, graph.heu = meta['dests'], arrays['heu']
+    return graph, meta
+
+
+# graphs already loaded in this process, key is the path of the edge file
+_graphs = dict()
+
+# edge files larger than this are compiled by the streaming ingest.py
+# instead of being parsed into memory
+STREAM_BYTES = 256 << 20
+
+
+def load_graph(path=EDGE_FILE):
+    """
+    Returns the Graph of the edge file, only reading it the first time, so
+    every searcher module that loads it at import shares the one Graph.
+
+    The compiled cache next to the edge file is used when neither the edge
+    file nor heuristic.csv changed since it was written, otherwise the csv
+    files are parsed and the cache is written again.
+    """
+    path = os.path.realpath(path)
+    if path not in _graphs:
+        _graphs[path] = _load(path)
+    return _graphs[path]
+
+
+def _load(path):
+    heuristic_path = heuristic_path_of(path)
+    cache_path = cache_path_of(path)
+    opened = open_graph(cache_path)
+    if opened is not None:
+        graph, meta = opened
+        sources = [('edges', path)]
+        if heuristic_path is not None:
+            sources.append(('heuristic', heuristic_path))
+        # a heuristic.csv that went away makes the cache stale as well
+        gone = heuristic_path is None and 'heuristic' in meta
+        if not gone and stamps_fresh(meta, sources, cache_path):
+            return graph
+        # unmap the stale cache first, a mapped file can not be replaced
+        # on Windows
+        opened = graph = meta = None
+
+    if os.path.getsize(path) > STREAM_BYTES:
+        from ingest import ingest
+        ingest(path, heuristic_path, cache_path)
+        return open_graph(cache_path)[0]
+    graph, meta = read_sources(path, heuristic_path)
+    try:
+        write_graph(graph, meta, cache_path)
+    except OSError:
+        # can not write next to the csv, just keep the parsed graph
+        return graph
+    return open_graph(cache_path)[0]
+
+
+if __name__ == '__main__':
+    # the compile step: python graph.py [edges.csv]
+    import sys
+    path = sys.argv[1] if len(sys.argv) > 1 else EDGE_FILE
+    graph = compile_graph(path)
+    print(f'{graph.num_nodes()} nodes, {graph.num_edges()} edges -> {cache_path_of(os.path.realpath(path))}')
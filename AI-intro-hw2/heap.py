@@ -0,0 +1,105 @@
+class IndexedHeap:
+    """
+    Binary min-heap of items with a decrease-key operation.
+
+    Every item is in the heap at most once; pos[item] is where it sits, so
+    a shorter distance found later moves the existing entry up instead of
+    pushing a duplicate that has to be skipped when it is popped.
+    The pushes/pops/decreases counters are kept for benchmarking.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.items = []
+        self.pos = dict()
+        self.pushes = 0
+        self.pops = 0
+        self.decreases = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, item):
+        return item in self.pos
+
+    def peek(self):
+        """
+        Returns the (key, item) with the smallest key without removing it.
+        """
+        return self.keys[0], self.items[0]
+
+    def key(self, item):
+        return self.keys[self.pos[item]]
+
+    def push(self, item, key):
+        """
+        Inserts item, or lowers its key if it is already in the heap.
+        Returns whether the heap changed.
+        """
+        i = self.pos.get(item)
+        if i is not None:
+            return self.decrease(item, key)
+        self.pushes += 1
+        self.keys.append(key)
+        self.items.append(item)
+        self.pos[item] = len(self.items) - 1
+        self._up(len(self.items) - 1)
+        return True
+
+    def decrease(self, item, key):
+        """
+        Lowers the key of an item already in the heap, a larger key is ignored.
+        """
+        i = self.pos[item]
+        if key >= self.keys[i]:
+            return False
+        self.decreases += 1
+        self.keys[i] = key
+        self._up(i)
+        return True
+
+    def pop(self):
+        """
+        Removes and returns the (key, item) with the smallest key.
+        """
+        self.pops += 1
+        keys, items = self.keys, self.items
+        key, item = keys[0], items[0]
+        del self.pos[item]
+        last_key, last_item = keys.pop(), items.pop()
+        if items:
+            keys[0], items[0] = last_key, last_item
+            self.pos[last_item] = 0
+            self._down(0)
+        return key, item
+
+    def _up(self, i):
+        keys, items, pos = self.keys, self.items, self.pos
+        key, item = keys[i], items[i]
+        while i > 0:
+            parent = (i - 1) >> 1
+            if keys[parent] <= key:
+                break
+            keys[i], items[i] = keys[parent], items[parent]
+            pos[items[i]] = i
+            i = parent
+        keys[i], items[i] = key, item
+        pos[item] = i
+
+    def _down(self, i):
+        keys, items, pos = self.keys, self.items, self.pos
+        n = len(items)
+        key, item = keys[i], items[i]
+        while True:
+            child = 2 * i + 1
+            if child >= n:
+                break
+            if child + 1 < n and keys[child + 1] < keys[child]:
+                child += 1
+            if key <= keys[child]:
+                break
+            keys[i], items[i] = keys[child], items[child]
+            pos[items[i]] = i
+            i = child
+        keys[i], items[i] = key, item
+        pos[item] = i
@@ -0,0 +1,174 @@
+import csv
+import os
+import tempfile
+from itertools import islice
+import numpy as np
+from graph import (ArrayWriter, Graph, cache_path_of, file_stamp,
+                   heuristic_path_of, read_heuristic)
+
+# Streaming compile of edge files too large to parse in memory.
+#
+# The edge file is read CHUNK_ROWS rows at a time.  Every chunk is sorted
+# by start and written to a temporary run file, then the runs are merged
+# block by block (an external merge sort) straight into the arrays of the
+# graph cache, reserved in the cache file and filled in place.  Only a few
+# blocks of edges are in memory at any time, plus the sorted node ids,
+# which are memory-mapped too.  The cache is the same file compile_graph
+# writes, edges leaving one node keep their file order, so load_graph
+# opens it like any other.
+
+CHUNK_ROWS = 1 << 20
+
+EDGE_DTYPE = np.dtype([('start', '<i8'), ('end', '<i8'),
+                       ('distance', '<f8'), ('speed', '<f4')])
+
+
+def read_chunks(path, rows=CHUNK_ROWS):
+    """
+    Yields the edge file as EDGE_DTYPE arrays of at most rows edges,
+    in file order.
+    """
+    with open(path, newline='') as edgeFile:
+        rws = csv.reader(edgeFile)
+        head = next(rws)
+        cols = [head.index(c) for c in ('start', 'end', 'distance', 'speed limit')]
+        while True:
+            block = list(islice(rws, rows))
+            if not block:
+                return
+            fields = list(zip(*block))
+            chunk = np.empty(len(block), dtype=EDGE_DTYPE)
+            for name, c in zip(EDGE_DTYPE.names, cols):
+                chunk[name] = np.array(fields[c], dtype=EDGE_DTYPE[name])
+            yield chunk
+
+
+def merge_runs(runs, key=None, block=1 << 16):
+    """
+    Merges arrays that are each sorted (by the field key, or by value when
+    key is None) into sorted blocks.  Equal keys come out in the order of
+    the runs, and in their order within a run, like a stable sort of the
+    concatenated runs.
+    """
+    field = (lambda a: a) if key is None else (lambda a: a[key])
+    pos = [0] * len(runs)
+    while True:
+        live = [r for r in range(len(runs)) if pos[r] < len(runs[r])]
+        if not live:
+            return
+        bufs = {r: runs[r][pos[r]:pos[r] + block] for r in live}
+        # everything up to the smallest (last key, run) of a buffer that
+        # does not end its run is final, nothing after it can be smaller
+        cut = min(((field(bufs[r])[-1], r) for r in live
+                   if pos[r] + len(bufs[r]) < len(runs[r])), default=None)
+        pieces = []
+        for r in live:
+            keys = field(bufs[r])
+            if cut is None or r == cut[1]:
+                k = len(keys)
+            else:
+                k = int(np.searchsorted(keys, cut[0], side='right' if r < cut[1] else 'left'))
+            pieces.append(bufs[r][:k])
+            pos[r] += k
+        out = np.concatenate(pieces)
+        if len(out):
+            yield out[np.argsort(field(out), kind='stable')]
+
+
+def _unique_ids(id_runs, tmp):
+    # sorted unique node ids of all the runs, memory-mapped from tmp
+    last = None
+    with open(tmp, 'wb') as f:
+        for blk in merge_runs(id_runs):
+            blk = np.unique(blk)
+            if last is not None and blk[0] == last:
+                blk = blk[1:]
+            if len(blk):
+                blk.tofile(f)
+                last = blk[-1]
+    if os.path.getsize(tmp) == 0:
+        return np.zeros(0, dtype=np.int64)
+    return np.memmap(tmp, dtype=np.int64, mode='r')
+
+
+def ingest(path, heuristic_path=None, cache_path=None, rows=CHUNK_ROWS):
+    """
+    Compiles the edge file (and heuristic.csv next to it, if any) into the
+    graph cache like graph.compile_graph, without holding the edges in
+    memory, and for edge files in any order.  Returns (num_nodes, num_edges).
+    """
+    path = os.path.realpath(path)
+    if heuristic_path is None:
+        heuristic_path = heuristic_path_of(path)
+    if cache_path is None:
+        cache_path = cache_path_of(path)
+    meta = {'edges': file_stamp(path)}
+
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(cache_path)) as tmp:
+        # pass 1: sorted runs of edges and of the node ids they touch
+        edge_runs, id_runs = [], []
+        for i, chunk in enumerate(read_chunks(path, rows)):
+            chunk = chunk[np.argsort(chunk['start'], kind='stable')]
+            ids = np.unique(np.concatenate((chunk['start'], chunk['end'])))
+            edge_runs.append(os.path.join(tmp, 'edges%d' % i))
+            id_runs.append(os.path.join(tmp, 'ids%d' % i))
+            chunk.tofile(edge_runs[-1])
+            ids.tofile(id_runs[-1])
+        edge_runs = [np.memmap(r, dtype=EDGE_DTYPE, mode='r') for r in edge_runs]
+        id_runs = [np.memmap(r, dtype=np.int64, mode='r') for r in id_runs]
+        m = sum(len(r) for r in edge_runs)
+        block = max(1024, rows // max(1, len(edge_runs)))
+
+        ids = _unique_ids(id_runs, os.path.join(tmp, 'ids'))
+        n = len(ids)
+
+        # pass 2: merge the runs into the CSR arrays of the cache
+        w = ArrayWriter(cache_path)
+        try:
+            out_ids = w.reserve('ids', np.int64, (n,))
+            for i in range(0, n, block):
+                out_ids[i:i + block] = ids[i:i + block]
+            offset = w.reserve('offset', np.int64, (n + 1,))
+            target = w.reserve('target', np.int32, (m,))
+            weight = w.reserve('weight', np.float64, (m,))
+            speed = w.reserve('speed', np.float32, (m,))
+
+            base, done = 0, 0   # edges written, nodes whose offset is written
+            for blk in merge_runs(edge_runs, 'start', block):
+                src = np.searchsorted(ids, blk['start'])
+                k = len(blk)
+                # offset[i] is the number of edges leaving indices < i
+                top = int(src[-1]) + 1
+                offset[done:top] = base + np.searchsorted(src, np.arange(done, top))
+                done = top
+                target[base:base + k] = np.searchsorted(ids, blk['end'])
+                weight[base:base + k] = blk['distance']
+                speed[base:base + k] = blk['speed']
+                base += k
+            offset[done:] = m
+
+            if heuristic_path is not None:
+                meta['heuristic'] = file_stamp(heuristic_path)
+                dests, heu = read_heuristic(Graph(ids, offset, target, weight, speed),
+                                            heuristic_path)
+                meta['dests'] = dests
+                w.add('heu', heu)
+            for arr in (out_ids, offset, target, weight, speed):
+                if isinstance(arr, np.memmap):
+                    arr.flush()
+            del out_ids, offset, target, weight, speed
+        except BaseException:
+            w.abort()
+            raise
+        w.close(meta)
+        del ids, edge_runs, id_runs
+    return n, m
+
+
+if __name__ == '__main__':
+    # python ingest.py [edges.csv]
+    import sys
+    from graph import EDGE_FILE
+    path = sys.argv[1] if len(sys.argv) > 1 else EDGE_FILE
+    n, m = ingest(path)
+    print(f'{n} nodes, {m} edges -> {cache_path_of(os.path.realpath(path))}')
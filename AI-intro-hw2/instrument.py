@@ -0,0 +1,178 @@
+import csv
+import heapq
+import sys
+import time
+from heap import IndexedHeap
+
+# Per-query instrumentation of the searchers.
+#
+# Every searcher takes an optional trace (default None).  Given a Trace it
+# builds its queue with trace.heap() (IndexedHeap searchers) or uses
+# trace.heapq() in place of the heapq module, reports bfs/dfs frontier
+# pushes and pops itself, and marks where its main loop and its path
+# building begin.  Without one every hook is a single `trace is None`
+# test.  record(search, ...) runs a searcher with a new Trace, so traces
+# of searches running at the same time do not mix.
+
+
+class Trace:
+    """
+    What one recorded search did.
+
+    pushes/pops       queue operations, a decrease-key is no push
+    stale_pops        pops of a node that was popped before (lazy deletion
+                      in heapq queues, an IndexedHeap has none)
+    relaxations       edges that gave a node a shorter distance, i.e.
+                      pushes plus decrease-keys (or heapq pushes)
+    peak_frontier     largest number of entries in the queues at once
+    phases            seconds spent in 'setup' (from the call to the main
+                      loop), 'search' (the main loop) and 'path' (building
+                      the answer), as marked by the searcher with phase()
+    order             (index, key) of every expanded node in pop order,
+                      only when recorded with order=True
+    """
+
+    def __init__(self, order=False):
+        self.pushes = 0
+        self.pops = 0
+        self.stale_pops = 0
+        self.relaxations = 0
+        self.frontier = 0
+        self.peak_frontier = 0
+        self.phases = dict()
+        self.order = [] if order else None
+        self.current = None     # the phase running since self.since
+        self.since = None
+
+    def phase(self, name):
+        """
+        Ends the running phase and starts name, None just ends it.
+        """
+        now = time.perf_counter()
+        if self.current is not None:
+            self.phases[self.current] = self.phases.get(self.current, 0.0) + now - self.since
+        self.current, self.since = name, now
+
+    def push(self):
+        self.pushes += 1
+        self.relaxations += 1
+        self.frontier += 1
+        if self.frontier > self.peak_frontier:
+            self.peak_frontier = self.frontier
+
+    def pop(self, item, key, stale=False):
+        self.pops += 1
+        self.frontier -= 1
+        if stale:
+            self.stale_pops += 1
+        elif self.order is not None:
+            self.order.append((item, key))
+
+    def heap(self):
+        """
+        A new IndexedHeap that reports to this trace.
+        """
+        return TracedHeap(self)
+
+    def heapq(self):
+        """
+        Stands in for the heapq module, reporting to this trace.
+        """
+        return TracedHeapq(self)
+
+    def stats(self):
+        return {'pushes': self.pushes, 'pops': self.pops,
+                'stale_pops': self.stale_pops, 'relaxations': self.relaxations,
+                'peak_frontier': self.peak_frontier, 'phases': dict(self.phases)}
+
+    def write_order(self, path, graph):
+        """
+        Writes the expansion order as csv (step, node, key), with the node
+        ids of graph so it can be joined with the node coordinates.
+        """
+        with open(path, 'w', newline='') as f:
+            w = csv.writer(f)
+            w.writerow(['step', 'node', 'key'])
+            ids = graph.node_ids([item for item, _ in self.order])
+            for step, (node, (_, key)) in enumerate(zip(ids, self.order)):
+                w.writerow([step, node, key])
+
+
+class TracedHeap(IndexedHeap):
+
+    def __init__(self, trace):
+        IndexedHeap.__init__(self)
+        self.trace = trace
+
+    def push(self, item, key):
+        if item in self.pos:
+            return self.decrease(item, key)
+        self.trace.push()
+        return IndexedHeap.push(self, item, key)
+
+    def decrease(self, item, key):
+        changed = IndexedHeap.decrease(self, item, key)
+        if changed:
+            self.trace.relaxations += 1
+        return changed
+
+    def pop(self):
+        key, item = IndexedHeap.pop(self)
+        self.trace.pop(item, key)
+        return key, item
+
+
+class TracedHeapq:
+    # heapq functions for queues of (key, ..., node) tuples
+
+    def __init__(self, trace):
+        self.trace = trace
+        self.popped = dict()    # id of the queue list -> nodes popped from it
+
+    def heappush(self, pq, entry):
+        self.trace.push()
+        heapq.heappush(pq, entry)
+
+    def heappop(self, pq):
+        entry = heapq.heappop(pq)
+        popped = self.popped.setdefault(id(pq), set())
+        node = entry[-1]
+        self.trace.pop(node, entry[0], node in popped)
+        popped.add(node)
+        return entry
+
+    def __getattr__(self, name):
+        return getattr(heapq, name)
+
+
+def record(search, *args, order=False, **kwargs):
+    """
+    Runs search(*args, trace=Trace(order), **kwargs).  Returns (result, Trace).
+    """
+    trace = Trace(order)
+    trace.phase('setup')
+    try:
+        res = search(*args, trace=trace, **kwargs)
+    finally:
+        trace.phase(None)
+    return res, trace
+
+
+if __name__ == '__main__':
+    from astar import astar
+    from bfs import bfs
+    from bidirectional import bidirectional_astar
+    from ch import ch_query
+    from dfs_stack import dfs
+    from graph import load_graph
+    from reach import isochrone
+    from ucs import ucs
+    for search in (bfs, dfs, ucs, astar, bidirectional_astar, ch_query):
+        _, trace = record(search, 2270143902, 1079387396)
+        print(search.__name__, trace.stats())
+    # python instrument.py order.csv writes the expansion order of astar
+    if len(sys.argv) > 1:
+        _, trace = record(astar, 2270143902, 1079387396, order=True)
+        trace.write_order(sys.argv[1], load_graph())
+    _, trace = record(isochrone, 2270143902, 1000.0)
+    print('isochrone', trace.stats())
@@ -0,0 +1,100 @@
+import heapq
+import numpy as np
+from arena import SearchArena
+from batch import pool_imap
+from dijkstra import shortest_path_tree
+from graph import EDGE_FILE, load_graph
+
+
+# Bounded Dijkstra over the road graph for "everything within N meters
+# (or seconds with timed=True) of a node".  Costs are meters on the graph
+# and seconds on graph.timed(), the same edges as astar_time uses.
+
+def _graph(path, timed):
+    graph = load_graph(path)
+    return graph.timed() if timed else graph
+
+
+def one_to_all(source, budget=None, timed=False, path=EDGE_FILE, trace=None):
+    """
+    Shortest distances from the node id source to every index, within
+    budget if one is given.  Returns (dist, prev) NumPy arrays indexed like
+    the graph: dist is inf and prev -1 where the index is not reached.
+    """
+    graph = _graph(path, timed)
+    arena, _ = shortest_path_tree(graph, graph.index(source), budget=budget, trace=trace)
+    done = arena.closed == arena.epoch
+    return (np.where(done, arena.dist, np.inf),
+            np.where(done, arena.prev, -1).astype(np.int32))
+
+
+def isochrone(source, budget, timed=False, path=EDGE_FILE, trace=None):
+    """
+    Node ids reachable from the node id source within budget, as an array.
+    """
+    graph = _graph(path, timed)
+    arena, _ = shortest_path_tree(graph, graph.index(source), budget=budget, trace=trace)
+    return graph.ids[arena.settled()]
+
+
+def iter_settled(source, budget=None, timed=False, path=EDGE_FILE):
+    """
+    Yields (node id, cost) of every node reachable from the node id source,
+    nearest first, up to budget.  Stop iterating to stop the search.
+
+    The generator keeps its own arena, so other searches may run on the
+    graph while it is suspended.
+    """
+    graph = _graph(path, timed)
+    off, tgt, wgt = graph.view()
+    ids = graph.ids
+    arena = SearchArena(graph.num_nodes())
+    ep = arena.reset()
+    dis, _, seen, closed = arena.view
+    budget = float('inf') if budget is None else budget
+    start = graph.index(source)
+    dis[start], seen[start] = 0.0, ep
+    pq = [(0.0, start)]
+
+    while pq:
+        d, nw = heapq.heappop(pq)
+        if closed[nw] == ep:
+            continue
+        if d > budget:
+            return
+        closed[nw] = ep
+        yield int(ids[nw]), d
+        for e in range(off[nw], off[nw+1]):
+            nxt = tgt[e]
+            nd = d + wgt[e]
+            if seen[nxt] != ep or nd < dis[nxt]:
+                seen[nxt], dis[nxt] = ep, nd
+                heapq.heappush(pq, (nd, nxt))
+
+
+def _isochrone_task(graph, task):
+    source, budget = task
+    arena, _ = shortest_path_tree(graph, graph.index(source), budget=budget)
+    return graph.ids[arena.settled()]
+
+
+def isochrones(sources, budget, timed=False, workers=None, path=EDGE_FILE):
+    """
+    Yields isochrone(source, budget) for every node id in sources, in order,
+    computed in parallel over a pool of worker processes (see batch.pool_imap).
+    """
+    return pool_imap(_isochrone_task, [(s, budget) for s in sources],
+                     workers, path, timed)
+
+
+if __name__ == '__main__':
+    import time
+    t = time.time()
+    near = isochrone(2270143902, 1000.0)
+    print(f'{len(near)} nodes within 1000 m ({(time.time() - t) * 1000:.1f} ms)')
+    near = isochrone(2270143902, 120.0, timed=True)
+    print(f'{len(near)} nodes within 120 s')
+    for node, d in iter_settled(2270143902):
+        if d > 200.0:
+            break
+        print(node, d)
@@ -0,0 +1,168 @@
+from collections import OrderedDict
+import numpy as np
+from graph import EDGE_FILE, load_graph
+
+
+class RouteCache:
+    """
+    Bounded LRU cache of search results in front of the searchers.
+
+    An entry is keyed by (algorithm, start, end, graph version) and holds
+    the path as an int64 array of node ids (end first, like the searchers
+    return it), the distance, the number of visited nodes, and the weight
+    of every edge along the path.  Changing the graph (Graph.set_edges,
+    see dynamic.py) bumps its version, which drops the whole cache.
+
+    For algorithms that return shortest paths, a miss whose start and end
+    both lie on a cached path of the same algorithm, start before end, is
+    answered with that part of the path: a part of a shortest path is a
+    shortest path itself.  Such an answer reports 0 visited nodes.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.on_path = dict()   # (algorithm, node id) -> keys of paths through it
+        self.version = None
+        self.hits = 0
+        self.subpath_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        self.entries.clear()
+        self.on_path.clear()
+
+    def _check(self, graph):
+        if graph.version != self.version:
+            if self.entries:
+                self.invalidations += 1
+            self.clear()
+            self.version = graph.version
+
+    def get(self, graph, algorithm, start, end, optimal=True):
+        """
+        Returns the cached (path, dist, num_visited) or None.
+        """
+        self._check(graph)
+        key = (algorithm, start, end, graph.version)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            path, dist, num_vised, _ = entry
+            return path.tolist(), dist, num_vised
+        if optimal:
+            res = self._subpath(algorithm, start, end)
+            if res is not None:
+                self.subpath_hits += 1
+                return res
+        self.misses += 1
+        return None
+
+    def _subpath(self, algorithm, start, end):
+        keys = self.on_path.get((algorithm, start))
+        if not keys:
+            return None
+        for key in keys & self.on_path.get((algorithm, end), set()):
+            path, _, _, legs = self.entries[key]
+            # the path runs from its last to its first node
+            i = int(np.flatnonzero(path == start)[-1])
+            j = int(np.flatnonzero(path == end)[0])
+            if j <= i:
+                self.entries.move_to_end(key)
+                dist = 0.0
+                for w in legs[j:i][::-1].tolist():  # add up in travel order
+                    dist += w
+                return path[j:i+1].tolist(), dist, 0
+        return None
+
+    def put(self, graph, algorithm, start, end, result, timed=False):
+        """
+        Stores the (path, dist, num_visited) of a search on graph, or on
+        graph.timed() when timed.
+        """
+        self._check(graph)
+        path, dist, num_vised = result
+        key = (algorithm, start, end, graph.version)
+        path = np.asarray(path, dtype=np.int64)
+        legs = _legs(graph.timed() if timed else graph, path)
+        self.entries[key] = (path, dist, num_vised, legs)
+        self.entries.move_to_end(key)
+        for node in np.unique(path).tolist():
+            self.on_path.setdefault((algorithm, node), set()).add(key)
+        while len(self.entries) > self.maxsize:
+            old, (path, _, _, _) = self.entries.popitem(last=False)
+            self.evictions += 1
+            for node in np.unique(path).tolist():
+                keys = self.on_path[(old[0], node)]
+                keys.discard(old)
+                if not keys:
+                    del self.on_path[(old[0], node)]
+
+    def hit_rate(self):
+        total = self.hits + self.subpath_hits + self.misses
+        return (self.hits + self.subpath_hits) / total if total else 0.0
+
+    def stats(self):
+        return {'size': len(self.entries), 'hits': self.hits,
+                'subpath_hits': self.subpath_hits, 'misses': self.misses,
+                'evictions': self.evictions, 'invalidations': self.invalidations,
+                'hit_rate': self.hit_rate()}
+
+
+def _legs(graph, path):
+    # legs[k] is the weight of the edge path[k+1] -> path[k], the lightest
+    # one if there are several, like a search would take
+    legs = np.empty(max(len(path) - 1, 0), dtype=np.float64)
+    for k in range(len(legs)):
+        u, v = graph.index(int(path[k+1])), graph.index(int(path[k]))
+        legs[k] = np.min(graph.weight[graph.edges_between(u, v)])
+    return legs
+
+
+# shared by everything wrapped with cached()
+routes = RouteCache()
+
+
+def cached(search, name=None, timed=False, optimal=True, cache=routes, path=EDGE_FILE):
+    """
+    Wraps a searcher search(start, end) -> (path, dist, num_visited) so its
+    results go through cache.  timed tells that it searches graph.timed(),
+    optimal that it returns shortest paths, so that cached paths may be cut
+    into answers for other queries (not for bfs or dfs).
+    """
+    name = name or search.__name__
+
+    def wrapper(start, end):
+        # the version of the graph itself counts for graph.timed() as well
+        graph = load_graph(path)
+        res = cache.get(graph, name, start, end, optimal)
+        if res is None:
+            res = search(start, end)
+            if res[0]:
+                cache.put(graph, name, start, end, res, timed)
+        return res
+
+    wrapper.__name__ = name
+    return wrapper
+
+
+if __name__ == '__main__':
+    import random
+    import time
+    from ucs import ucs
+    graph = load_graph()
+    cached_ucs = cached(ucs)
+    rnd = random.Random(0)
+    popular = [(int(s), int(t)) for s, t in rnd.sample(list(zip(graph.ids[::7], graph.ids[3::7])), 50)]
+    queries = [rnd.choice(popular) for _ in range(500)]
+    tic = time.time()
+    for s, t in queries:
+        cached_ucs(s, t)
+    print(f'{len(queries)} queries in {time.time() - tic:.2f} s')
+    print(routes.stats())
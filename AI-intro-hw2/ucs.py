@@ -1,69 +1,57 @@
-import csv
-import os
-import heapq
+from arena import get_arena
+from graph import load_graph
+from heap import IndexedHeap
 
-py_dir = os.path.dirname(os.path.realpath(__file__))
-edgeFile = open(py_dir+'\\edges.csv', newline='')
-rws = csv.DictReader(edgeFile)
+graph = load_graph()
 
-# use dict to store edges 
-# key is start. And value is a 2d-list
-# [[end, dis, spd_lim], ...]
-edges = dict()
-lis = list()
-prev = -1
-for rw in rws:
-    # because edges.csv is sorted by start node, this way is okay
-    if int(rw['start']) != prev:
-        edges[prev] = lis
-        prev = int(rw['start'])
-        lis = list() # initialize
-
-    lis.append([int(rw['end']), float(rw['distance']), float(rw['speed limit'])])
-edgeFile.close() # data are stored in edges, thus close the file
-
-# use heapq (priority_queue) storing 
-# tuple containing (dis, next_node)
-# to get mini distance choice
-def ucs(start, end):
+# use an indexed heap (priority_queue) of next_node keyed by dis
+# to get mini distance choice, a shorter distance found later
+# decreases the key instead of pushing the node again
+def ucs(start, end, trace=None):
     # Begin your code (Part 3)
 
     # initialize
-    ans = dict()
-    ans[start] = [0.0, -1]# the distance from start to start is 0
-    nw = (0, start) # changed to tuple
-    pq = []
+    off, tgt, wgt = graph.view()
+    start, end = graph.index(start), graph.index(end)
+    arena = get_arena(graph)
+    ep = arena.reset()
+    dis, prev, seen, closed = arena.view
+    dis[start], prev[start], seen[start] = 0.0, -1, ep# the distance from start to start is 0
+    pq = IndexedHeap() if trace is None else trace.heap()
+    pq.push(start, 0.0)
     num_vised = 0
-    done = False
     path = list()
-
-    while not done:
-        for next in edges[nw[1]]: # next is a list [end, dis, spd_lim]
-            if next[0] in edges: # if there is edge started from this node
-                if next[0] != end and next[0] not in ans:
-                    # works when not achieve to final node
-                    # and this node has not been visited yet
-                    heapq.heappush(pq, (ans[nw[1]][0]+next[1], next[0]) )
-                    ans[next[0]] = [ans[nw[1]][0] + next[1], nw[1]]# update the distance and num_node
-                    num_vised+=1
-                elif next[0] in ans and ans[next[0]][0]>=ans[nw[1]][0]+next[1]:
-                    # renew to shortest distance
-                    heapq.heappush(pq, (ans[nw[1]][0]+next[1], next[0]) )
-                    ans[next[0]] = [ans[nw[1]][0] + next[1], nw[1]]
-                elif next[0]==end: # reach the end
-                    ans[next[0]] = [ans[nw[1]][0] + next[1], nw[1]]
-                    # to get the path by reversing back
-                    back = end
-                    path.append(back)
-                    while ans[back][1] != start:
-                        path.append(ans[back][1])
-                        back = ans[back][1]
-                    path.append(start)
-                    done = True
-                    num_vised+=1
-        nw = heapq.heappop(pq)
-
-    return path, ans[end][0], num_vised
+    if trace is not None:
+        trace.phase('search')
+
+    while pq:
+        d, nw = pq.pop()
+        closed[nw] = ep # its shortest distance is known
+        if nw == end: # reach the end, its distance can not get shorter
+            break
+        for e in range(off[nw], off[nw+1]): # e is the index of edge (nw, tgt[e])
+            nxt = tgt[e]
+            if closed[nxt] == ep:
+                continue
+            if seen[nxt] != ep:
+                # this node has not been visited yet
+                seen[nxt], dis[nxt], prev[nxt] = ep, d + wgt[e], nw# update the distance and num_node
+                pq.push(nxt, d + wgt[e])
+                num_vised+=1
+            elif d + wgt[e] < dis[nxt]:
+                # renew to shortest distance
+                dis[nxt], prev[nxt] = d + wgt[e], nw
+                pq.decrease(nxt, d + wgt[e])
+
+    if closed[end] != ep: # end can not be reached from start
+        return path, float('inf'), num_vised
+
+    if trace is not None:
+        trace.phase('path')
+    # to get the path by reversing back
+    path = arena.path(start, end)
+
+    return graph.node_ids(path), dis[end], num_vised
 
     # End your code (Part 3)
 
@@ -0,0 +1,73 @@
+"""
+Checks the incremental Zobrist hash of GameStateData against rehash().
+
+    python check_zobrist.py --moves 40000 --seed 0
+
+Random games are played on the classic layouts, pacman and the ghosts
+taking turns with random legal moves.  Before every move all children of
+the state are generated, like a search does, and then the hash of the
+state and of every child must equal the one rehash() computes from
+scratch.  The state must also keep its hash after its children were made
+(the children share its food, capsules and agents until they change them).
+"""
+import optparse
+import random
+import sys
+import layout
+from pacman import GameState
+
+LAYOUTS = ['smallClassic', 'mediumClassic', 'capsuleClassic', 'trickyClassic',
+           'powerClassic', 'openClassic']
+
+
+def fresh(data):
+    """
+    The hash rehash() computes for data, leaving data as it was.
+    """
+    incremental, keys = data._zobrist, data._agentKeys
+    data.rehash()
+    full = data._zobrist
+    data._zobrist, data._agentKeys = incremental, keys
+    return full
+
+
+def check(moves, seed):
+    rnd = random.Random(seed)
+    done = 0
+    games = 0
+    while done < moves:
+        lay = layout.getLayout(LAYOUTS[games % len(LAYOUTS)])
+        games += 1
+        state = GameState()
+        state.initialize(lay, lay.getNumGhosts())
+        agent = 0
+        while done < moves and not (state.isWin() or state.isLose()):
+            before = state.data._zobrist
+            children = [(action, state.getNextState(agent, action))
+                        for action in state.getLegalActions(agent)]
+            if state.data._zobrist != before or before != fresh(state.data):
+                return 'game %d, move %d: the state changed its hash' % (games, done)
+            for action, child in children:
+                if child.data._zobrist != fresh(child.data):
+                    return 'game %d, move %d: agent %d %s hashes wrong' % (games, done, agent, action)
+            state = rnd.choice(children)[1]
+            agent = (agent + 1) % state.getNumAgents()
+            done += 1
+    return None
+
+
+def main():
+    parser = optparse.OptionParser(usage=__doc__.strip())
+    parser.add_option('--moves', type='int', default=40000)
+    parser.add_option('--seed', type='int', default=0)
+    options, _ = parser.parse_args()
+    wrong = check(options.moves, options.seed)
+    if wrong is not None:
+        print(wrong)
+        return 1
+    print('ok: %d moves, every hash equals rehash()' % options.moves)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
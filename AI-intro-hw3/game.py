@@ -1,4 +1,5 @@
 from util import *
+import random
 import time
 import os
 import traceback
@@ -144,33 +145,42 @@ class AgentState:
 
 class Grid:
     """
-    A 2-dimensional array of objects backed by a list of lists.  Data is accessed
-    via grid[x][y] where (x,y) are positions on a Pacman map with x horizontal,
-    y vertical and the origin (0,0) in the bottom left corner.
+    A 2-dimensional array of booleans backed by the bits of one Python int.
+    Data is accessed via grid[x][y] where (x,y) are positions on a Pacman map
+    with x horizontal, y vertical and the origin (0,0) in the bottom left corner.
+
+    Cell (x,y) is bit x * height + y of bits.  Ints are immutable, so a copy
+    just shares the int and a write makes a new one: copies are O(1) and
+    copy-on-write, count() is a popcount and asList() walks the set bits.
 
     The __str__ method constructs an output that is oriented like a pacman board.
     """
 
     def __init__(self, width, height, initialValue=False, bitRepresentation=None):
-        if initialValue not in [False, True]:
+        if not isinstance(initialValue, bool):
             raise Exception('Grids can only contain booleans')
         self.CELLS_PER_INT = 30
 
         self.width = width
         self.height = height
-        self.data = [[initialValue for y in range(
-            height)] for x in range(width)]
+        self.bits = (1 << (width * height)) - 1 if initialValue else 0
         if bitRepresentation:
             self._unpackBits(bitRepresentation)
 
-    def __getitem__(self, i):
-        return self.data[i]
+    def __getitem__(self, x):
+        if x < 0:
+            x += self.width
+        if not 0 <= x < self.width:
+            raise IndexError('grid index out of range')
+        return GridColumn(self, x * self.height)
 
-    def __setitem__(self, key, item):
-        self.data[key] = item
+    def __setitem__(self, x, column):
+        col = self[x]
+        for y, item in enumerate(column):
+            col[y] = item
 
     def __str__(self):
-        out = [[str(self.data[x][y])[0] for x in range(self.width)]
+        out = [[str(self[x][y])[0] for x in range(self.width)]
                for y in range(self.height)]
         out.reverse()
         return '\n'.join([''.join(x) for x in out])
@@ -178,41 +188,38 @@ class Grid:
     def __eq__(self, other):
         if other == None:
             return False
-        return self.data == other.data
+        return (self.bits == other.bits and self.width == other.width
+                and self.height == other.height)
 
     def __hash__(self):
-        # return hash(str(self))
-        base = 1
-        h = 0
-        for l in self.data:
-            for i in l:
-                if i:
-                    h += base
-                base *= 2
-        return hash(h)
+        return hash(self.bits)
 
     def copy(self):
         g = Grid(self.width, self.height)
-        g.data = [x[:] for x in self.data]
+        g.bits = self.bits
         return g
 
     def deepCopy(self):
         return self.copy()
 
     def shallowCopy(self):
-        g = Grid(self.width, self.height)
-        g.data = self.data
-        return g
+        # the same as copy(), writes to one grid never show in the other
+        return self.copy()
 
     def count(self, item=True):
-        return sum([x.count(item) for x in self.data])
+        n = bin(self.bits).count('1')
+        return n if item else self.width * self.height - n
 
     def asList(self, key=True):
+        bits = self.bits
+        if not key:
+            bits = ~bits & ((1 << (self.width * self.height)) - 1)
         list = []
-        for x in range(self.width):
-            for y in range(self.height):
-                if self[x][y] == key:
-                    list.append((x, y))
+        height = self.height
+        while bits:
+            low = bits & -bits
+            list.append(divmod(low.bit_length() - 1, height))
+            bits ^= low
         return list
 
     def packBits(self):
@@ -235,7 +242,7 @@ class Grid:
         return tuple(bits)
 
     def _cellIndexToPosition(self, index):
-        x = index / self.height
+        x = index // self.height
         y = index % self.height
         return x, y
 
@@ -266,6 +273,39 @@ class Grid:
         return bools
 
 
+class GridColumn:
+    """
+    Column x of a Grid, so that grid[x][y] reads and writes bit x * height + y.
+    """
+    __slots__ = ('grid', 'base')
+
+    def __init__(self, grid, base):
+        self.grid = grid
+        self.base = base
+
+    def __len__(self):
+        return self.grid.height
+
+    def __getitem__(self, y):
+        grid = self.grid
+        if y < 0:
+            y += grid.height
+        if not 0 <= y < grid.height:
+            raise IndexError('grid index out of range')
+        return grid.bits >> (self.base + y) & 1 == 1
+
+    def __setitem__(self, y, item):
+        grid = self.grid
+        if y < 0:
+            y += grid.height
+        if not 0 <= y < grid.height:
+            raise IndexError('grid index out of range')
+        if item:
+            grid.bits |= 1 << (self.base + y)
+        else:
+            grid.bits &= ~(1 << (self.base + y))
+
+
 def reconstituteGrid(bitRep):
     if type(bitRep) is not type((1, 2)):
         return bitRep
@@ -331,11 +371,16 @@ class Actions:
         if (abs(x - x_int) + abs(y - y_int) > Actions.TOLERANCE):
             return [config.getDirection()]
 
+        # test the wall bits directly (see Grid), this runs for every child state
+        bits, width, height = walls.bits, walls.width, walls.height
         for dir, vec in Actions._directionsAsList:
             dx, dy = vec
             next_y = y_int + dy
             next_x = x_int + dx
-            if not walls[next_x][next_y]:
+            if 0 <= next_x < width and 0 <= next_y < height:
+                if not bits >> (next_x * height + next_y) & 1:
+                    possible.append(dir)
+            elif not walls[next_x][next_y]:
                 possible.append(dir)
 
         return possible
@@ -366,6 +411,58 @@ class Actions:
     getNextState = staticmethod(getNextState)
 
 
+class Zobrist:
+    """
+    Random 64 bit keys for the parts of a game state, made on first use.
+
+    The hash of a state is the XOR of the keys of its food, capsules and
+    agent states, so a move only XORs out the keys of what it changed and
+    XORs in the new ones instead of hashing the whole board again.
+    """
+
+    def __init__(self, seed=188):
+        self.keys = {}
+        # own generator, so hashing never changes the game's random moves
+        self.random = random.Random(seed)
+
+    def __getitem__(self, part):
+        key = self.keys.get(part)
+        if key is None:
+            key = self.keys[part] = self.random.getrandbits(64)
+        return key
+
+    def agent(self, index, agentState):
+        conf = agentState.configuration
+        if conf == None:
+            return self['agent', index, None, None, agentState.scaredTimer]
+        return self['agent', index, conf.pos, conf.direction, agentState.scaredTimer]
+
+
+ZOBRIST = Zobrist()
+
+
+# layouts that pickled states refer to by a key instead of carrying them,
+# every process that loads such a state must have shared the same layout
+_sharedLayouts = {} # key -> layout
+_layoutKeys = {} # id(layout) -> key
+
+def shareLayout(layout, key=None):
+    """
+    From now on states on layout pickle only key (by default a new one) in
+    place of the layout.  Returns the key.
+    """
+    if key is None:
+        key = _layoutKeys.get(id(layout), id(layout))
+    _sharedLayouts[key] = layout
+    _layoutKeys[id(layout)] = key
+    return key
+
+def unshareLayout(key):
+    layout = _sharedLayouts.pop(key, None)
+    if layout is not None:
+        del _layoutKeys[id(layout)]
+
+
 class GameStateData:
 
     def __init__(self, prevState=None):
@@ -373,12 +470,21 @@ class GameStateData:
         Generates a new data packet by copying information from its predecessor.
         """
         if prevState != None:
-            self.food = prevState.food.shallowCopy()
-            self.capsules = prevState.capsules[:]
-            self.agentStates = self.copyAgentStates(prevState.agentStates)
+            # copy-on-write: the food grid, the capsule list and the agent
+            # states are shared with prevState until the rules change them,
+            # see eatFood, eatCapsule and ownAgentState
+            self.food = prevState.food
+            self.capsules = prevState.capsules
+            self.agentStates = prevState.agentStates[:]
             self.layout = prevState.layout
             self._eaten = prevState._eaten
             self.score = prevState.score
+            self._zobrist = prevState._zobrist
+            self._agentKeys = prevState._agentKeys[:]
+        else:
+            self._zobrist = 0
+            self._agentKeys = []
+        self._owned = 0  # bit i is set once agentStates[i] is this state's own copy
 
         self._foodEaten = None
         self._foodAdded = None
@@ -391,6 +497,9 @@ class GameStateData:
     def deepCopy(self):
         state = GameStateData(self)
         state.food = self.food.deepCopy()
+        state.capsules = self.capsules[:]
+        state.agentStates = self.copyAgentStates(self.agentStates)
+        state._owned = (1 << len(state.agentStates)) - 1
         state.layout = self.layout.deepCopy()
         state._agentMoved = self._agentMoved
         state._foodEaten = self._foodEaten
@@ -423,19 +532,82 @@ class GameStateData:
 
     def __hash__(self):
         """
-        Allows states to be keys of dictionaries.
+        Allows states to be keys of dictionaries.  The Zobrist hash of the
+        food, capsules and agents is kept up to date by the rules in pacman.py
+        (see eatFood, eatCapsule and updateAgentHash), so this is O(1).
+        """
+        return hash((self._zobrist, self.score))
+
+    def ownAgentState(self, index):
+        """
+        Returns agentStates[index] to be changed, copying it first if it is
+        still shared with the state this one was made from.
+        """
+        if not self._owned >> index & 1:
+            self.agentStates[index] = self.agentStates[index].copy()
+            self._owned |= 1 << index
+        return self.agentStates[index]
+
+    def eatFood(self, x, y):
+        self.food = self.food.copy()
+        self.food[x][y] = False
+        self._zobrist ^= ZOBRIST['food', x, y]
+
+    def eatCapsule(self, position):
+        self.capsules = [c for c in self.capsules if c != position]
+        self._zobrist ^= ZOBRIST['capsule', position]
+
+    def updateAgentHash(self, index):
+        """
+        Rehashes agentStates[index] after its configuration or scaredTimer changed.
+        """
+        key = ZOBRIST.agent(index, self.agentStates[index])
+        self._zobrist ^= self._agentKeys[index] ^ key
+        self._agentKeys[index] = key
+
+    def rehash(self):
+        """
+        Computes the Zobrist hash from scratch.
+        """
+        self._zobrist = 0
+        for x, y in self.food.asList():
+            self._zobrist ^= ZOBRIST['food', x, y]
+        for position in self.capsules:
+            self._zobrist ^= ZOBRIST['capsule', position]
+        self._agentKeys = [ZOBRIST.agent(i, s) for i, s in enumerate(self.agentStates)]
+        for key in self._agentKeys:
+            self._zobrist ^= key
+
+    def __getstate__(self):
+        """
+        Pickles only what the rules need to go on from this state, to send
+        it to another process (see the workers of MultiAgentSearchAgent).
+        The hash is left out: ZOBRIST makes its keys in the order they are
+        first used, so every process has its own and rehashes on loading.
+        The changes of the last move, which only the display reads, are
+        left out too, and a shared layout (see shareLayout) is only
+        referred to by its key.
         """
-        for i, state in enumerate(self.agentStates):
-            try:
-                int(hash(state))
-            except TypeError as e:
-                print(e)
-                # hash(state)
-        return int((hash(tuple(self.agentStates)) + 13*hash(self.food) + 113 * hash(tuple(self.capsules)) + 7 * hash(self.score)) % 1048575)
+        layout = _layoutKeys.get(id(self.layout), self.layout)
+        return (self.food, self.capsules, self.agentStates, layout,
+                self._eaten, self.score, self._lose, self._win)
+
+    def __setstate__(self, state):
+        (self.food, self.capsules, self.agentStates, self.layout,
+         self._eaten, self.score, self._lose, self._win) = state
+        if isinstance(self.layout, int):
+            self.layout = _sharedLayouts[self.layout]
+        self._owned = (1 << len(self.agentStates)) - 1
+        self._foodEaten = None
+        self._foodAdded = None
+        self._capsuleEaten = None
+        self._agentMoved = None
+        self.scoreChange = 0
+        self.rehash()
 
     def __str__(self):
         width, height = self.layout.width, self.layout.height
-        map = Grid(width, height)
+        map = [[None] * height for x in range(width)]
         if type(self.food) == type((1, 2)):
             self.food = reconstituteGrid(self.food)
         for x in range(width):
@@ -458,7 +630,9 @@ class GameStateData:
         for x, y in self.capsules:
             map[x][y] = 'o'
 
-        return str(map) + ("\nScore: %d\n" % self.score)
+        rows = [''.join(map[x][y] for x in range(width)) for y in range(height)]
+        rows.reverse()
+        return '\n'.join(rows) + ("\nScore: %d\n" % self.score)
 
     def _foodWallStr(self, hasFood, hasWall):
         if hasFood:
@@ -509,6 +683,8 @@ class GameStateData:
             self.agentStates.append(AgentState(
                 Configuration(pos, Directions.STOP), isPacman))
         self._eaten = [False for a in self.agentStates]
+        self._owned = (1 << len(self.agentStates)) - 1
+        self.rehash()
 
 
 try:
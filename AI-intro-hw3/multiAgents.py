@@ -1,7 +1,8 @@
 from util import manhattanDistance
 from game import Directions
-import random, util
-from game import Agent
+import multiprocessing, random, time, util
+from game import Agent, shareLayout, unshareLayout
+import ghostAgents
 
 class ReflexAgent(Agent):
     """
@@ -85,6 +86,152 @@ def scoreEvaluationFunction(currentGameState):
     return currentGameState.getScore()
 
 
+class TranspositionTable:
+    """
+    Fixed size table of search results, shared by the search agents.
+
+    A key is (state, agentIndex, remaining depth), hashed in O(1) by the
+    Zobrist hash of the state (see GameStateData).  A result is the value
+    with a flag telling whether it is exact or, after an alpha-beta cut,
+    only a LOWER or UPPER bound of the real value.
+
+    Every key has one slot (hash % size).  A new result replaces the one in
+    its slot when that is from an earlier getAction (newSearch) or searched
+    no deeper, so the deep results of the current move are kept longest.
+    A result may carry the best move found, for MoveOrdering.
+    """
+    EXACT, LOWER, UPPER = 0, 1, 2
+
+    def __init__(self, size):
+        self.size = size
+        self.slots = [None] * size # (key, value, flag, generation, move)
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def newSearch(self):
+        self.generation += 1
+
+    def probe(self, key):
+        """
+        Returns the (key, value, flag, generation, move) stored for key, or None.
+        """
+        self.probes += 1
+        slot = self.slots[hash(key) % self.size]
+        if slot is not None and slot[0] == key:
+            self.hits += 1
+            return slot
+        return None
+
+    def store(self, key, value, flag=EXACT, move=None):
+        i = hash(key) % self.size
+        slot = self.slots[i]
+        if (slot is None or slot[3] != self.generation or slot[0] == key
+                or key[2] >= slot[0][2]):
+            self.slots[i] = (key, value, flag, self.generation, move)
+            self.stores += 1
+
+    def bestMove(self, key):
+        """
+        The move stored for key or, failing that, for the same node searched
+        one ply shallower (the depth before in iterativeDeepening), or None.
+        """
+        state, agentIndex, depth = key
+        for k in (key, (state, agentIndex, depth - 1)):
+            slot = self.probe(k)
+            if slot is not None and slot[4] is not None:
+                return slot[4]
+        return None
+
+    def cutoff(self, key, alpha, beta):
+        """
+        The stored value of key if it settles a node searched with the
+        window (alpha, beta), else None.
+        """
+        slot = self.probe(key)
+        if slot is None:
+            return None
+        _, value, flag, _, _ = slot
+        if (flag == self.EXACT or (flag == self.LOWER and value >= beta)
+                or (flag == self.UPPER and value <= alpha)):
+            return value
+        return None
+
+    def storeBound(self, key, value, alpha, beta, move=None):
+        """
+        Stores the result of a node searched with the window (alpha, beta).
+        """
+        if value <= alpha:
+            self.store(key, value, self.UPPER, move)
+        elif value >= beta:
+            self.store(key, value, self.LOWER, move)
+        else:
+            self.store(key, value, self.EXACT, move)
+
+
+class MoveOrdering:
+    """
+    Orders the moves of an alpha-beta node so that the ones likely to cut
+    come first:
+
+      1. the best move stored in the TranspositionTable for the node,
+      2. the killer moves, the last two moves that cut at the same ply,
+      3. the history table, how much a move from the same position of the
+         same agent cut before (remaining depth squared per cut),
+      4. the score of the child, best for the moving agent first.
+
+    Killers belong to one getAction (newSearch), history is halved there.
+    """
+
+    def __init__(self):
+        self.killers = dict() # ply -> [move, move]
+        self.history = util.Counter() # (agentIndex, position, move) -> weight
+
+    def newSearch(self):
+        self.killers.clear()
+        for k in self.history:
+            self.history[k] //= 2
+
+    def order(self, GS, agentIndex, ply, ttMove=None):
+        """
+        Returns the [(move, child state)] of agentIndex in GS, ordered.
+        """
+        pos = GS.data.agentStates[agentIndex].getPosition()
+        killers = self.killers.get(ply, ())
+        sign = -1 if agentIndex == 0 else 1 # pacman wants high scores
+        ranked = []
+        for ac in GS.getLegalActions(agentIndex):
+            child = GS.getNextState(agentIndex, ac)
+            if ac == ttMove:
+                first = 0
+            elif ac in killers:
+                first = 1 + killers.index(ac)
+            else:
+                first = 3
+            ranked.append((first, -self.history[(agentIndex, pos, ac)],
+                           sign * child.getScore(), len(ranked), ac, child))
+        ranked.sort()
+        return [(r[4], r[5]) for r in ranked]
+
+    def cutoff(self, GS, agentIndex, ply, remaining, move):
+        """
+        Records that move cut off the node GS at ply.
+        """
+        killers = self.killers.setdefault(ply, [])
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[2:]
+        self.history[(agentIndex, GS.data.agentStates[agentIndex].getPosition(), move)] += remaining * remaining
+
+
+class SearchTimeout(Exception):
+    """
+    Raised inside a search once the deadline of the move has passed.
+    """
+    pass
+
+
 class MultiAgentSearchAgent(Agent):
     """
     This class provides some common elements to all of your
@@ -98,12 +245,147 @@ class MultiAgentSearchAgent(Agent):
     Note: this is an abstract class: one that should not be instantiated.  It's
     only partially specified, and designed to be extended.  Agent (game.py)
     is another abstract class.
+
+    ttSize > 0 gives the agent a TranspositionTable of that many slots (for
+    example -a depth=4,ttSize=200000).  It is off by default, as it changes
+    the number of explored states the autograder checks.
+
+    timeLimit > 0 makes the search anytime: it deepens 1, 2, ... up to depth
+    and plays the best move of the deepest search done within timeLimit
+    seconds (-a depth=10,timeLimit=0.5).  Keep it below the --timeout of the
+    game (ClassicGameRules.getMoveTimeout).
+
+    workers > 0 searches the moves of pacman at the root in parallel, each
+    in one of a pool of that many processes (-a depth=4,workers=4).  The
+    processes live until the game ends (final) or close() is called, and
+    keep their own transposition tables.  They get the layout once when
+    they start, the states sent to them only refer to it.  evalFn may be
+    a function instead of a name, then it has to be one that pickle can
+    send to them (defined at the top of a module).  States explored by
+    the workers are not seen by getAndResetExplored.
     """
 
-    def __init__(self, evalFn = 'scoreEvaluationFunction', depth = '2'):
+    def __init__(self, evalFn = 'scoreEvaluationFunction', depth = '2', ttSize = '0', timeLimit = '0', workers = '0'):
         self.index = 0 # Pacman is always agent index 0
-        self.evaluationFunction = util.lookup(evalFn, globals())
+        if callable(evalFn):
+            self.evaluationFunction = evalFn
+        else:
+            self.evaluationFunction = util.lookup(evalFn, globals())
         self.depth = int(depth)
+        self.tt = TranspositionTable(int(ttSize)) if int(ttSize) > 0 else None
+        self.timeLimit = float(timeLimit)
+        self.deadline = None # checked by the searches while deepening
+        self.workers = int(workers)
+        self.pool = None
+        self.poolLayout = None # the layout shared with the pool
+        self.layoutKey = None # and its key (see game.shareLayout)
+        self.options = dict(evalFn=evalFn, depth=depth, ttSize=ttSize) # of the workers' agents
+        self.searchId = 0
+        self.nodes = 0
+
+    def newSearch(self):
+        """
+        Called by getAction before it searches a new position.
+        """
+        self.searchId += 1
+        if self.tt is not None:
+            self.tt.newSearch()
+
+    def childValue(self, child, alpha):
+        """
+        The value of child, a state after a move of pacman at the root, for
+        a search that only needs to know more than alpha exactly.
+        """
+        util.raiseNotDefined()
+
+    def parallelRoot(self, gameState, legalMoves, eldestFirst=False):
+        """
+        Returns the first of legalMoves with the best childValue, searching
+        the children in the process pool.  With eldestFirst the first child
+        is searched here before the others are sent off, with its value as
+        their alpha (young brothers wait).
+        """
+        if self.pool is not None and self.poolLayout is not gameState.data.layout:
+            self.close() # the workers only know the layout of another game
+        if self.pool is None:
+            self.poolLayout = gameState.data.layout
+            self.layoutKey = shareLayout(self.poolLayout)
+            self.pool = multiprocessing.Pool(self.workers, _initWorker,
+                                             (type(self), self.options, self.layoutKey, self.poolLayout))
+        children = [gameState.getNextState(0, action) for action in legalMoves]
+        scores = []
+        alpha = float('-inf')
+        if eldestFirst:
+            alpha = self.childValue(children[0], alpha)
+            scores.append(alpha)
+        tasks = [(child, alpha, self.depth, self.deadline, self.searchId)
+                 for child in children[len(scores):]]
+        for score, nodes in self.pool.map(_searchChild, tasks, chunksize=1):
+            scores.append(score)
+            self.nodes += nodes
+        return legalMoves[scores.index(max(scores))]
+
+    def close(self):
+        """
+        Stops the processes of parallelRoot, they are started again when
+        needed.
+        """
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+            unshareLayout(self.layoutKey)
+            self.poolLayout = self.layoutKey = None
+
+    def final(self, state):
+        self.close()
+
+    def iterativeDeepening(self, gameState, searchRoot):
+        """
+        Runs searchRoot(gameState, legalMoves) -> action with depth 1, 2, ...
+        until self.depth or until timeLimit has passed, and returns the action
+        of the last search that finished.  Each search tries the action the
+        one before found first.  Depth 1 always runs to the end.
+        """
+        maxDepth = self.depth
+        legalMoves = gameState.getLegalActions(0)
+        deadline = time.time() + self.timeLimit
+        best = None
+        try:
+            for depth in range(1, maxDepth + 1):
+                self.depth = depth
+                self.deadline = deadline if depth > 1 else None
+                if best is not None: # best move of the last depth first
+                    legalMoves.remove(best)
+                    legalMoves.insert(0, best)
+                best = searchRoot(gameState, legalMoves)
+                if time.time() > deadline:
+                    break
+        except SearchTimeout:
+            pass
+        finally:
+            self.depth = maxDepth
+            self.deadline = None
+        return best
+
+
+# the agent of a worker process of parallelRoot
+_worker = None
+
+def _initWorker(cls, options, layoutKey, layout):
+    global _worker
+    _worker = cls(**options)
+    shareLayout(layout, layoutKey)
+
+def _searchChild(task):
+    child, alpha, depth, deadline, searchId = task
+    if searchId != _worker.searchId:
+        _worker.newSearch()
+        _worker.searchId = searchId
+    _worker.depth = depth
+    _worker.deadline = deadline
+    nodes = _worker.nodes
+    return _worker.childValue(child, alpha), _worker.nodes - nodes
 
 
 class MinimaxAgent(MultiAgentSearchAgent):
@@ -135,9 +417,19 @@ class MinimaxAgent(MultiAgentSearchAgent):
         Returns whether or not the game state is a losing state
         """
         # Begin your code (Part 1)
+        self.newSearch()
+        if self.timeLimit > 0:
+            return self.iterativeDeepening(gameState, self.searchRoot)
 
         # Collect legal moves and child states
-        legalMoves = gameState.getLegalActions(0)
+        return self.searchRoot(gameState, gameState.getLegalActions(0))
+
+    def childValue(self, child, alpha):
+        return self.min_vl(1, 0, child)
+
+    def searchRoot(self, gameState, legalMoves):
+        if self.workers > 0:
+            return self.parallelRoot(gameState, legalMoves)
 
         # Choose one of the best actions
         scores = [self.min_vl(1, 0, gameState.getNextState(0, action)) for action in legalMoves]
@@ -149,27 +441,44 @@ class MinimaxAgent(MultiAgentSearchAgent):
     def max_vl(self, dep, GS):
         if GS.isWin() or GS.isLose() or dep == self.depth:
             return self.evaluationFunction(GS)
+        if self.deadline is not None and time.time() > self.deadline:
+            raise SearchTimeout()
+        if self.tt is not None: # same state, agent and depth left as before
+            key = (GS, 0, self.depth - dep)
+            slot = self.tt.probe(key)
+            if slot is not None:
+                return slot[1]
 
         ls = []
         act_ls = GS.getLegalActions(0)
         for ac in act_ls:
             ls.append(self.min_vl(1, dep, GS.getNextState(0, ac)))
+        if self.tt is not None:
+            self.tt.store(key, max(ls))
         return max(ls)
 
     def min_vl(self, ag, dep, GS):
         if GS.isWin() or GS.isLose() or dep == self.depth:
             return self.evaluationFunction(GS)
+        if self.deadline is not None and time.time() > self.deadline:
+            raise SearchTimeout()
+        if self.tt is not None:
+            key = (GS, ag, self.depth - dep)
+            slot = self.tt.probe(key)
+            if slot is not None:
+                return slot[1]
 
         ls = []
         act_ls = GS.getLegalActions(ag)
         if ag == GS.getNumAgents() - 1: # last ghost
             for ac in act_ls:
                 ls.append(self.max_vl(dep+1, GS.getNextState(ag, ac)))
-            return min(ls)
         else:
             for ac in act_ls:
                 ls.append(self.min_vl(ag+1, dep, GS.getNextState(ag, ac)))
-            return min(ls)
+        if self.tt is not None:
+            self.tt.store(key, min(ls))
+        return min(ls)
 
          # isWin() means eating all foods
          # isLose() means being hit by the ghost
@@ -180,18 +489,61 @@ class MinimaxAgent(MultiAgentSearchAgent):
 class AlphaBetaAgent(MultiAgentSearchAgent):
     """
     Your minimax agent with alpha-beta pruning (Part 2)
+
+    ordering=1 searches the moves of every node in MoveOrdering order and
+    prunes as soon as alpha >= beta; without it moves go in the order of
+    getLegalActions and only alpha > beta prunes, which the autograder
+    expects.  nodeCounts adds up the nodes searched per depth over the
+    game, nodes=1 prints them at its end.
+
+    With workers, ybw=1 searches the first move at the root before handing
+    out the others, which then prune with its value (young brothers wait).
     """
 
+    def __init__(self, evalFn = 'scoreEvaluationFunction', depth = '2', ttSize = '0',
+                 timeLimit = '0', workers = '0', ordering = '0', nodes = '0', ybw = '0'):
+        MultiAgentSearchAgent.__init__(self, evalFn, depth, ttSize, timeLimit, workers)
+        self.ordering = MoveOrdering() if int(ordering) else None
+        self.options['ordering'] = ordering
+        self.showNodes = bool(int(nodes))
+        self.ybw = bool(int(ybw))
+        self.nodeCounts = util.Counter() # depth -> nodes searched
+
+    def final(self, state):
+        MultiAgentSearchAgent.final(self, state)
+        if self.showNodes:
+            for depth in sorted(self.nodeCounts):
+                print('depth %d: %d nodes' % (depth, self.nodeCounts[depth]))
+
     def getAction(self, gameState):
         """
         Returns the minimax action using self.depth and self.evaluationFunction
         """
         # Begin your code (Part 2)
+        self.newSearch()
+        if self.timeLimit > 0:
+            return self.iterativeDeepening(gameState, self.searchRoot)
+
+        # Collect legal moves and child states
+        return self.searchRoot(gameState, gameState.getLegalActions(0))
+
+    def newSearch(self):
+        MultiAgentSearchAgent.newSearch(self)
+        if self.ordering is not None:
+            self.ordering.newSearch()
+
+    def childValue(self, child, alpha):
+        return self.min_ab(1, 0, child, alpha, float('inf'))
+
+    def searchRoot(self, gameState, legalMoves):
+        self.nodes = 0
+        if self.workers > 0:
+            bestAct = self.parallelRoot(gameState, legalMoves, self.ybw)
+            self.nodeCounts[self.depth] += self.nodes
+            return bestAct
 
         alpha = float('-inf')
         beta = float('inf')
-        # Collect legal moves and child states
-        legalMoves = gameState.getLegalActions(0)
 
         # Choose one of the best actions
         bestScore = float('-inf')
@@ -200,40 +552,86 @@ class AlphaBetaAgent(MultiAgentSearchAgent):
             if(bestScore > alpha):
                 alpha = bestScore
                 bestAct = act
+        self.nodeCounts[self.depth] += self.nodes
         return bestAct
-    
+
+    def moves(self, GS, ag, dep):
+        # (action, child) pairs of ag, in search order
+        if self.ordering is None:
+            return ((ac, GS.getNextState(ag, ac)) for ac in GS.getLegalActions(ag))
+        ttMove = None
+        if self.tt is not None:
+            ttMove = self.tt.bestMove((GS, ag, self.depth - dep))
+        return self.ordering.order(GS, ag, dep * GS.getNumAgents() + ag, ttMove)
+
+    def prune(self, GS, ag, dep, alpha, beta, ac):
+        # whether the window closed after searching ac
+        if self.ordering is None:
+            return alpha > beta
+        if alpha >= beta:
+            self.ordering.cutoff(GS, ag, dep * GS.getNumAgents() + ag, self.depth - dep, ac)
+            return True
+        return False
 
     def min_ab(self, ag, dep, GS, alpha, beta):
         if GS.isWin() or GS.isLose() or dep == self.depth:
             return self.evaluationFunction(GS)
-        
+        if self.deadline is not None and time.time() > self.deadline:
+            raise SearchTimeout()
+        self.nodes += 1
+        if self.tt is not None: # a stored value or bound may settle this node
+            key = (GS, ag, self.depth - dep)
+            vl = self.tt.cutoff(key, alpha, beta)
+            if vl is not None:
+                return vl
+            window = (alpha, beta)
+
         vl = float('inf')
-        act_ls = GS.getLegalActions(ag)
+        best = None
         if ag == GS.getNumAgents() - 1:
-            for ac in act_ls:
-                vl = min(vl, self.max_ab(dep+1, GS.getNextState(ag, ac), alpha, beta))
+            for ac, child in self.moves(GS, ag, dep):
+                v = self.max_ab(dep+1, child, alpha, beta)
+                if v < vl:
+                    vl, best = v, ac
                 beta = min(beta, vl)
-                if alpha > beta:
+                if self.prune(GS, ag, dep, alpha, beta, ac):
                     break
         else:
-            for ac in act_ls:
-                vl = min(vl, self.min_ab(ag+1, dep, GS.getNextState(ag, ac), alpha, beta))
+            for ac, child in self.moves(GS, ag, dep):
+                v = self.min_ab(ag+1, dep, child, alpha, beta)
+                if v < vl:
+                    vl, best = v, ac
                 beta = min(beta, vl)
-                if alpha > beta:
+                if self.prune(GS, ag, dep, alpha, beta, ac):
                     break
+        if self.tt is not None:
+            self.tt.storeBound(key, vl, *window, best)
         return vl
 
     def max_ab(self, dep, GS, alpha, beta):
         if GS.isWin() or GS.isLose() or dep == self.depth:
             return self.evaluationFunction(GS)
+        if self.deadline is not None and time.time() > self.deadline:
+            raise SearchTimeout()
+        self.nodes += 1
+        if self.tt is not None:
+            key = (GS, 0, self.depth - dep)
+            vl = self.tt.cutoff(key, alpha, beta)
+            if vl is not None:
+                return vl
+            window = (alpha, beta)
 
         vl = float('-inf')
-        act_ls = GS.getLegalActions(0)
-        for ac in act_ls:
-            vl = max(vl, self.min_ab(1, dep, GS.getNextState(0, ac), alpha, beta))
+        best = None
+        for ac, child in self.moves(GS, 0, dep):
+            v = self.min_ab(1, dep, child, alpha, beta)
+            if v > vl:
+                vl, best = v, ac
             alpha = max(alpha, vl)
-            if alpha > beta:
+            if self.prune(GS, 0, dep, alpha, beta, ac):
                 break
+        if self.tt is not None:
+            self.tt.storeBound(key, vl, *window, best)
         return vl
         # End your code (Part 2)
 
@@ -241,8 +639,66 @@ class AlphaBetaAgent(MultiAgentSearchAgent):
 class ExpectimaxAgent(MultiAgentSearchAgent):
     """
       Your expectimax agent (Part 3)
+
+    A chance node takes the expected value over the moves of its ghost,
+    uniformly at random by default.  ghost names a GhostAgent class of
+    ghostAgents.py (-a ghost=DirectionalGhost) whose getDistribution gives
+    the probabilities instead; moves it never makes are not searched.
+
+    samples > 0 estimates the joint move of all ghosts from that many
+    joint moves drawn from their distributions (sparse sampling), so a ply
+    has at most samples outcomes however many ghosts there are.
     """
 
+    def __init__(self, evalFn = 'scoreEvaluationFunction', depth = '2', ttSize = '0',
+                 timeLimit = '0', workers = '0', ghost = '', samples = '0'):
+        MultiAgentSearchAgent.__init__(self, evalFn, depth, ttSize, timeLimit, workers)
+        self.ghostType = util.lookup(ghost, vars(ghostAgents)) if ghost else None
+        self.ghostModels = dict() # agentIndex -> ghostType(agentIndex)
+        self.samples = int(samples)
+        self.random = random.Random(0) # the game's own random stays untouched
+        self.options.update(ghost=ghost, samples=samples)
+
+    def distribution(self, GS, ag):
+        """
+        [(action, probability)] of the ghost ag in GS.
+        """
+        if self.ghostType is None:
+            act_ls = GS.getLegalActions(ag)
+            return [(ac, 1.0 / len(act_ls)) for ac in act_ls]
+        model = self.ghostModels.get(ag)
+        if model is None:
+            model = self.ghostModels[ag] = self.ghostType(ag)
+        return [(ac, p) for ac, p in model.getDistribution(GS).items() if p > 0]
+
+    def sampleGhosts(self, dep, GS):
+        """
+        The expected value after all ghosts move in GS, averaged over
+        self.samples joint moves drawn from their distributions.  A joint
+        move drawn several times is searched once.
+        """
+        counts = util.Counter() # joint move -> times drawn
+        states = {(): GS} # joint moves and their beginnings -> state
+        dists = dict()
+        for _ in range(self.samples):
+            moves, state = (), GS
+            for ag in range(1, GS.getNumAgents()):
+                if state.isWin() or state.isLose():
+                    break
+                if moves not in dists:
+                    dists[moves] = tuple(zip(*self.distribution(state, ag)))
+                act_ls, probs = dists[moves]
+                ac = self.random.choices(act_ls, probs)[0]
+                moves += (ac,)
+                if moves not in states:
+                    states[moves] = state.getNextState(ag, ac)
+                state = states[moves]
+            counts[moves] += 1
+        vl = 0
+        for moves, n in counts.items():
+            vl = vl + n * self.max_ex(dep+1, states[moves])
+        return vl / self.samples
+
     def getAction(self, gameState):
         """
         Returns the expectimax action using self.depth and self.evaluationFunction
@@ -251,9 +707,19 @@ class ExpectimaxAgent(MultiAgentSearchAgent):
         legal moves.
         """
         # Begin your code (Part 3)
+        self.newSearch()
+        if self.timeLimit > 0:
+            return self.iterativeDeepening(gameState, self.searchRoot)
 
         # Collect legal moves and child states
-        legalMoves = gameState.getLegalActions(0)
+        return self.searchRoot(gameState, gameState.getLegalActions(0))
+
+    def childValue(self, child, alpha):
+        return self.min_ex(1, 0, child)
+
+    def searchRoot(self, gameState, legalMoves):
+        if self.workers > 0:
+            return self.parallelRoot(gameState, legalMoves)
 
         # Choose one of the best actions
         scores = [self.min_ex(1, 0, gameState.getNextState(0, action)) for action in legalMoves]
@@ -264,27 +730,45 @@ class ExpectimaxAgent(MultiAgentSearchAgent):
     def max_ex(self, dep, GS):
         if GS.isWin() or GS.isLose() or dep == self.depth:
             return self.evaluationFunction(GS)
+        if self.deadline is not None and time.time() > self.deadline:
+            raise SearchTimeout()
+        if self.tt is not None:
+            key = (GS, 0, self.depth - dep)
+            slot = self.tt.probe(key)
+            if slot is not None:
+                return slot[1]
 
         ls = []
         act_ls = GS.getLegalActions(0)
         for ac in act_ls:
             ls.append(self.min_ex(1, dep, GS.getNextState(0, ac)))
+        if self.tt is not None:
+            self.tt.store(key, max(ls))
         return max(ls)
 
     def min_ex(self, ag, dep, GS):
         if GS.isWin() or GS.isLose() or dep == self.depth:
             return self.evaluationFunction(GS)
-
-        sum = 0
-        act_ls = GS.getLegalActions(ag)
-        if ag == GS.getNumAgents() - 1:
-            for ac in act_ls:
-                sum = sum + self.max_ex(dep+1, GS.getNextState(ag, ac))
-            return sum
+        if self.deadline is not None and time.time() > self.deadline:
+            raise SearchTimeout()
+        if self.tt is not None: # the expected value of this chance node
+            key = (GS, ag, self.depth - dep)
+            slot = self.tt.probe(key)
+            if slot is not None:
+                return slot[1]
+
+        vl = 0
+        if self.samples > 0 and ag == 1:
+            vl = self.sampleGhosts(dep, GS)
+        elif ag == GS.getNumAgents() - 1:
+            for ac, p in self.distribution(GS, ag):
+                vl = vl + p * self.max_ex(dep+1, GS.getNextState(ag, ac))
         else:
-            for ac in act_ls:
-                sum = sum + self.min_ex(ag+1, dep, GS.getNextState(ag, ac))
-            return sum
+            for ac, p in self.distribution(GS, ag):
+                vl = vl + p * self.min_ex(ag+1, dep, GS.getNextState(ag, ac))
+        if self.tt is not None:
+            self.tt.store(key, vl)
+        return vl
         # End your code (Part 3)
 
 
@@ -145,6 +145,8 @@ def run(lay, layName, pac, ghosts, disp, nGames=1, name='games'):
 
 class GradingAgent(Agent):
     def __init__(self, seed, studentAgent, optimalActions, altDepthActions, partialPlyBugActions):
+        # the number of explored states is graded
+        GameState.trackExplored()
         # save student agent and actions of refernce agents
         self.studentAgent = studentAgent
         self.optimalActions = optimalActions
@@ -226,6 +228,8 @@ class GradingAgent(Agent):
 
 class PolyAgent(Agent):
     def __init__(self, seed, multiAgents, ourPacOptions, depth):
+        # the number of explored states is recorded
+        GameState.trackExplored()
         # prepare our pacman agents
         solutionAgents, alternativeDepthAgents, partialPlyBugAgents = self.construct_our_pacs(
             multiAgents, ourPacOptions)
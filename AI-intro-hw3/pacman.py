@@ -27,6 +27,7 @@ The keys are 'a', 's', 'd', and 'w' to move (or arrow keys).  Have fun!
 """
 from game import GameStateData
 from game import Game
+from game import Configuration
 from game import Directions
 from game import Actions
 from util import nearestPoint
@@ -63,11 +64,25 @@ class GameState:
     # Accessor methods: use these to access state data #
     ####################################################
 
-    # static variable keeps track of which states have had getLegalActions called
-    explored = set()
+    # static variable keeps track of which states getNextState has seen, but
+    # only after trackExplored() (the autograder counts them), so normal play
+    # and search neither hash every state nor keep them all alive
+    explored = None
+    exploredLimit = None
+
+    def trackExplored(enabled=True, limit=None):
+        """
+        Starts (or with enabled=False stops) recording the explored states,
+        at most limit of them between two getAndResetExplored calls.
+        """
+        GameState.explored = set() if enabled else None
+        GameState.exploredLimit = limit
+    trackExplored = staticmethod(trackExplored)
 
     def getAndResetExplored():
-        tmp = GameState.explored.copy()
+        tmp = GameState.explored
+        if tmp is None:  # not tracking
+            return set()
         GameState.explored = set()
         return tmp
     getAndResetExplored = staticmethod(getAndResetExplored)
@@ -93,7 +108,8 @@ class GameState:
         if self.isWin() or self.isLose():
             raise Exception('Can\'t generate a child of a terminal state.')
 
-        # Copy current state
+        # Copy current state, it shares everything with self until the
+        # rules below change it (see GameStateData.ownAgentState)
         state = GameState(self)
 
         # Let agent's logic deal with its action's effects on the board
@@ -113,10 +129,24 @@ class GameState:
         GhostRules.checkDeath(state, agentIndex)
 
         # Book keeping
+        if agentIndex == 0:  # eating a capsule or a ghost changes the ghosts too
+            for index in range(state.getNumAgents()):
+                state.data.updateAgentHash(index)
+        else:
+            state.data.updateAgentHash(agentIndex)
         state.data._agentMoved = agentIndex
         state.data.score += state.data.scoreChange
-        GameState.explored.add(self)
-        GameState.explored.add(state)
+        explored = GameState.explored
+        if explored is not None:
+            limit = GameState.exploredLimit
+            if limit is None:
+                explored.add(self)
+                explored.add(state)
+            else:  # each add checks, so there are never more than limit
+                if len(explored) < limit:
+                    explored.add(self)
+                if len(explored) < limit:
+                    explored.add(state)
         return state
 
     def getLegalPacmanActions(self):
@@ -345,7 +375,7 @@ class PacmanRules:
         if action not in legal:
             raise Exception("Illegal action " + str(action))
 
-        pacmanState = state.data.agentStates[0]
+        pacmanState = state.data.ownAgentState(0)
 
         # Update Configuration
         vector = Actions.directionToVector(action, PacmanRules.PACMAN_SPEED)
@@ -365,8 +395,7 @@ class PacmanRules:
         # Eat food
         if state.data.food[x][y]:
             state.data.scoreChange += 10
-            state.data.food = state.data.food.copy()
-            state.data.food[x][y] = False
+            state.data.eatFood(x, y)
             state.data._foodEaten = position
             # TODO: cache numFood?
             numFood = state.getNumFood()
@@ -375,11 +404,11 @@ class PacmanRules:
                 state.data._win = True
         # Eat capsule
         if(position in state.getCapsules()):
-            state.data.capsules.remove(position)
+            state.data.eatCapsule(position)
             state.data._capsuleEaten = position
             # Reset all ghosts' scared timers
             for index in range(1, len(state.data.agentStates)):
-                state.data.agentStates[index].scaredTimer = SCARED_TIME
+                state.data.ownAgentState(index).scaredTimer = SCARED_TIME
     consume = staticmethod(consume)
 
 
@@ -411,7 +440,7 @@ class GhostRules:
         if action not in legal:
             raise Exception("Illegal ghost action " + str(action))
 
-        ghostState = state.data.agentStates[ghostIndex]
+        ghostState = state.data.ownAgentState(ghostIndex)
         speed = GhostRules.GHOST_SPEED
         if ghostState.scaredTimer > 0:
             speed /= 2.0
@@ -423,8 +452,10 @@ class GhostRules:
     def decrementTimer(ghostState):
         timer = ghostState.scaredTimer
         if timer == 1:
-            ghostState.configuration.pos = nearestPoint(
-                ghostState.configuration.pos)
+            # a new Configuration, the old one may be shared with other states
+            conf = ghostState.configuration
+            ghostState.configuration = Configuration(
+                nearestPoint(conf.pos), conf.direction)
         ghostState.scaredTimer = max(0, timer - 1)
     decrementTimer = staticmethod(decrementTimer)
 
@@ -445,10 +476,12 @@ class GhostRules:
 
     def collide(state, ghostState, agentIndex):
         if ghostState.scaredTimer > 0:
+            ghostState = state.data.ownAgentState(agentIndex)
             state.data.scoreChange += 200
             GhostRules.placeGhost(state, ghostState)
             ghostState.scaredTimer = 0
             # Added for first-person
+            state.data._eaten = state.data._eaten[:]
             state.data._eaten[agentIndex] = True
         else:
             if not state.data._win:
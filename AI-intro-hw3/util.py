@@ -153,35 +153,91 @@ class PriorityQueue:
     has a priority associated with it and the client is usually interested
     in quick retrieval of the lowest-priority item in the queue. This
     data structure allows O(1) access to the lowest-priority item.
+
+    update() is O(log n) for a hashable item that is in the queue once: the
+    live entries of each item are kept in self.entries, and an entry whose
+    priority was lowered is marked removed (the new one keeps its count, so
+    equal priorities still pop first in, first out) and skipped when it
+    reaches the top of the heap.  Items pushed more than once are updated
+    by a scan of the heap, like before.
     """
+    REMOVED = object()
 
     def __init__(self):
         self.heap = []
         self.count = 0
+        self.entries = {}  # item -> its live entries in the heap
 
     def push(self, item, priority):
-        entry = (priority, self.count, item)
-        heapq.heappush(self.heap, entry)
+        self._push([priority, self.count, item])
         self.count += 1
 
+    def _push(self, entry):
+        heapq.heappush(self.heap, entry)
+        self._track(entry)
+
+    def _track(self, entry):
+        try:
+            self.entries.setdefault(entry[2], []).append(entry)
+        except TypeError:
+            pass  # unhashable, update() falls back to a scan
+
+    def _forget(self, entry):
+        # entry left the heap, drop it from the live entries of its item
+        try:
+            live = self.entries.get(entry[2])
+        except TypeError:
+            return
+        for index, e in enumerate(live):
+            if e is entry:
+                del live[index]
+                break
+        if not live:
+            del self.entries[entry[2]]
+
     def pop(self):
-        (_, _, item) = heapq.heappop(self.heap)
-        return item
+        self._dropRemoved()
+        entry = heapq.heappop(self.heap)
+        self._forget(entry)
+        return entry[2]
 
     def isEmpty(self):
+        self._dropRemoved()
         return len(self.heap) == 0
 
+    def _dropRemoved(self):
+        while self.heap and self.heap[0][2] is PriorityQueue.REMOVED:
+            heapq.heappop(self.heap)
+
     def update(self, item, priority):
         # If item already in priority queue with higher priority, update its priority and rebuild the heap.
         # If item already in priority queue with equal or lower priority, do nothing.
         # If item not in priority queue, do the same thing as self.push.
+        try:
+            live = self.entries.get(item)
+        except TypeError:
+            return self._scanUpdate(item, priority)
+        if live is None:
+            self.push(item, priority)
+        elif len(live) > 1:
+            self._scanUpdate(item, priority)
+        elif live[0][0] > priority:
+            entry = live[0]
+            self._forget(entry)
+            entry[2] = PriorityQueue.REMOVED
+            self._push([priority, entry[1], item])
+
+    def _scanUpdate(self, item, priority):
         for index, (p, c, i) in enumerate(self.heap):
-            if i == item:
+            if i is not PriorityQueue.REMOVED and i == item:
                 if p <= priority:
                     break
+                self._forget(self.heap[index])
                 del self.heap[index]
-                self.heap.append((priority, c, item))
+                entry = [priority, c, item]
+                self.heap.append(entry)
                 heapq.heapify(self.heap)
+                self._track(entry)
                 break
         else:
             self.push(item, priority)